@@ -0,0 +1,151 @@
+import hashlib
+import os
+from typing import List
+from DBMS.BufferPool import buffer_pool
+
+
+class BloomFilter:
+    def __init__(self, file_path: str, bit_count: int, hash_count: int, file_count: int):
+        """
+        Initialize the persistent Bloom filters of a table, one per heap file, over the primary keys of its records.
+        A filter never rules out a key that is stored in its file, so a file whose filter rules out a key does not
+        have to be read when searching for it. Keys cannot be removed from a filter, so deletions are only counted,
+        and a filter is rebuilt from its file once too many of its keys were deleted (see is_stale()).
+
+        File Structure: [ filter of file 1 | filter of file 2 | ... ]
+        Filter Structure: [ added key count (4) | deleted key count (4) | bits ]
+
+        :param file_path: Path of the filter file, it is created if it does not exist.
+        :param bit_count: Number of bits of each filter.
+        :param hash_count: Number of bits set for each key.
+        :param file_count: Number of heap files of the table.
+        """
+
+        # constants
+        self.FILTER_HEADER_SIZE = 8
+        self.STALE_DELETE_RATIO = 0.5 # a filter is rebuilt once this share of the keys added to it were deleted
+
+        self.file_path = file_path
+        self.bit_count = bit_count
+        self.hash_count = hash_count
+        self.FILTER_SIZE = self.FILTER_HEADER_SIZE + (bit_count + 7) // 8
+
+        if not os.path.exists(file_path):
+            open(file_path, 'wb')
+
+        # key counts of each filter, kept in memory as well
+        self.added = []
+        self.deleted = []
+        for position in range(file_count):
+            header = self._read_filter(position)[:self.FILTER_HEADER_SIZE]
+            self.added.append(int.from_bytes(header[0:4], 'big'))
+            self.deleted.append(int.from_bytes(header[4:8], 'big'))
+
+    def _read_filter(self, position: int) -> bytearray:
+        return buffer_pool.get_page(self.file_path, position, self.FILTER_SIZE)
+
+    def _write_counts(self, position: int) -> None:
+        bloom = self._read_filter(position)
+        bloom[0:4] = self.added[position].to_bytes(4, 'big')
+        bloom[4:8] = self.deleted[position].to_bytes(4, 'big')
+        buffer_pool.mark_dirty(self.file_path, position)
+
+    def positions(self, key: bytes) -> List[int]:
+        """
+        :return: Positions of the bits of a key in a filter, computed once and passed to add() and may_contain().
+        """
+        # double hashing, the two hashes are halves of a single digest
+        digest = hashlib.blake2b(key, digest_size=8).digest()
+        first_hash = int.from_bytes(digest[:4], 'big')
+        second_hash = int.from_bytes(digest[4:], 'big') | 1
+        return [(first_hash + i * second_hash) % self.bit_count for i in range(self.hash_count)]
+
+    def add(self, file_index: int, positions: List[int]) -> None:
+        """
+        Add a key to the filter of a file.
+        :param file_index: Index of the file the record with the key is stored in.
+        :param positions: Bit positions of the key, see positions().
+        """
+        position = file_index - 1
+        bloom = self._read_filter(position)
+        for bit in positions:
+            bloom[self.FILTER_HEADER_SIZE + (bit >> 3)] |= 1 << (bit & 7)
+        self.added[position] += 1
+        bloom[0:4] = self.added[position].to_bytes(4, 'big')
+        buffer_pool.mark_dirty(self.file_path, position)
+
+    def may_contain(self, file_index: int, positions: List[int]) -> bool:
+        """
+        :param file_index: Index of the file.
+        :param positions: Bit positions of the key, see positions().
+        :return: False if the file surely does not store the key, True if it might.
+        """
+        bloom = self._read_filter(file_index - 1)
+        for bit in positions:
+            if not bloom[self.FILTER_HEADER_SIZE + (bit >> 3)] & (1 << (bit & 7)):
+                return False
+        return True
+
+    def record_delete(self, file_index: int) -> None:
+        """
+        Count a key deleted from a file, its bits stay set until the filter is rebuilt.
+        :param file_index: Index of the file.
+        """
+        self.deleted[file_index - 1] += 1
+        self._write_counts(file_index - 1)
+
+    def is_stale(self, file_index: int) -> bool:
+        """
+        :return: True if so many keys of the filter of a file were deleted that it should be rebuilt.
+        """
+        position = file_index - 1
+        return self.deleted[position] > 0 and self.deleted[position] >= self.STALE_DELETE_RATIO * self.added[position]
+
+    def clear(self, file_index: int) -> None:
+        """
+        Remove all keys from the filter of a file, before it is rebuilt.
+        :param file_index: Index of the file.
+        """
+        position = file_index - 1
+        buffer_pool.create_page(self.file_path, position, self.FILTER_SIZE)
+        buffer_pool.mark_dirty(self.file_path, position)
+        self.added[position] = 0
+        self.deleted[position] = 0
+
+    def replace(self, file_index: int, keys_positions: List[List[int]]) -> None:
+        """
+        Replace the filter of a file with one holding only the given keys, when it is rebuilt.
+        The new filter is built aside and written at once, so a search running meanwhile sees either filter.
+        :param file_index: Index of the file.
+        :param keys_positions: Bit positions of each key, see positions().
+        """
+        position = file_index - 1
+        bits = bytearray(self.FILTER_SIZE - self.FILTER_HEADER_SIZE)
+        for positions in keys_positions:
+            for bit in positions:
+                bits[bit >> 3] |= 1 << (bit & 7)
+        self.added[position] = len(keys_positions)
+        self.deleted[position] = 0
+        bloom = self._read_filter(position)
+        bloom[:] = (self.added[position].to_bytes(4, 'big') + self.deleted[position].to_bytes(4, 'big')) + bits
+        buffer_pool.mark_dirty(self.file_path, position)
+
+    def add_file(self) -> int:
+        """
+        Register a new, empty heap file.
+        :return: File index of the new file.
+        """
+        self.added.append(0)
+        self.deleted.append(0)
+        self.clear(len(self.added))
+        return len(self.added)
+
+    def reset(self, file_count: int) -> None:
+        """
+        Reset the filters to the given number of files, with no keys.
+        :param file_count: Number of heap files of the table.
+        """
+        self.added = [0] * file_count
+        self.deleted = [0] * file_count
+        for file_index in range(1, file_count + 1):
+            self.clear(file_index)
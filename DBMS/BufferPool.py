@@ -0,0 +1,289 @@
+import atexit
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from DBMS.Stats import stats
+
+# page number used for the header at the start of a file
+FILE_HEADER_PAGE = -1
+
+
+class Frame:
+    """A cached page and whether it has been modified since it was read from disk."""
+    def __init__(self, data: bytearray, offset: int):
+        self.data = data
+        self.offset = offset
+        self.dirty = False
+        self.image = None # contents as of the last write-ahead log record of the page, if any since the last checkpoint
+        self.lsn = 0 # position in the write-ahead log after the last record of the page
+
+
+class BufferPool:
+    def __init__(self, capacity: int = 64 * 1024 * 1024, max_open_files: int = 64):
+        """
+        Initialize a buffer pool caching whole pages of files in memory.
+        Pages are keyed by (file path, page number) and evicted in least recently used order once the total size of
+        the cached pages, and of the page images kept for the write-ahead log, exceeds the capacity. Modified pages are written back when evicted or flushed.
+
+        Callers modify the bytearray returned by get_page() in place and then call mark_dirty() before requesting
+        any other page, so the page cannot be evicted in between.
+
+        When a write-ahead log is attached, pages modified since the last commit are never written back (no-steal),
+        and a page is only written back once the log records of its changes are on disk. Such pages are pinned: they
+        leave the LRU order until the commit, so eviction never has to skip them. Operations modifying many pages call
+        commit_if_full() between independent steps, so the pinned pages cannot outgrow the budget.
+
+        :param capacity: Memory budget for cached pages, in bytes.
+        :param max_open_files: Maximum number of file handles kept open at once.
+        """
+        self.capacity = capacity
+        self.max_open_files = max_open_files
+        self.used = 0 # bytes of the cached pages and of their images
+        self.frames: Dict[Tuple[str, int], Frame] = {}
+        self.lru: OrderedDict[Tuple[str, int], None] = OrderedDict() # keys of the evictable pages, least recently used first
+        self.handles: OrderedDict[str, object] = OrderedDict()
+        self.unsynced_files = set() # files written since the last sync_files()
+
+        self.lock = threading.RLock() # held while the pool is used, so commands reading pages can run in parallel threads
+        self.wal = None # write-ahead log protecting the pages, see DBMS/WriteAheadLog.py
+        self.uncommitted = set() # keys of the pages modified since the last commit of the write-ahead log, pinned
+        self.uncommitted_size = 0 # bytes of the pinned pages
+
+    def _handle(self, file_path: str):
+        handle = self.handles.get(file_path)
+        if handle is not None:
+            self.handles.move_to_end(file_path)
+            return handle
+        if len(self.handles) >= self.max_open_files:
+            _, oldest = self.handles.popitem(last=False)
+            oldest.close()
+        handle = open(file_path, 'r+b')
+        if stats.enabled:
+            stats.add("file_opens")
+        self.handles[file_path] = handle
+        return handle
+
+    def get_page(self, file_path: str, page_number: int, page_size: int, header_size: int = 0) -> bytearray:
+        """
+        Get a page of a file, reading it from disk if it is not cached.
+        :param file_path: Path of the file.
+        :param page_number: Page number in the file, or FILE_HEADER_PAGE for the file header.
+        :param page_size: Size of the pages of the file. Ignored for the file header.
+        :param header_size: Size of the header preceding the first page of the file.
+        :return: The cached page, parts of it beyond the end of the file are zeroes.
+        """
+        with self.lock:
+            key = (file_path, page_number)
+            frame = self.frames.get(key)
+            if stats.enabled:
+                stats.add("page_requests")
+            if frame is not None:
+                if key in self.lru:
+                    self.lru.move_to_end(key)
+                return frame.data
+
+            if page_number == FILE_HEADER_PAGE:
+                offset, size = 0, header_size
+            else:
+                offset, size = header_size + page_number * page_size, page_size
+
+            f = self._handle(file_path)
+            f.seek(offset)
+            data = bytearray(f.read(size).ljust(size, b'\x00'))
+            if stats.enabled:
+                stats.add("pages_read")
+                stats.add("bytes_read", size)
+
+            self.frames[key] = Frame(data, offset)
+            self.lru[key] = None
+            self.used += size
+            self._evict()
+            return data
+
+    def create_page(self, file_path: str, page_number: int, page_size: int, header_size: int = 0) -> bytearray:
+        """
+        Get a page of a file with all of its bytes set to zero, without reading it from disk.
+        Used to rewrite pages whose old contents do not matter. Like get_page(), the caller marks the page dirty.
+        :return: The cached page.
+        """
+        with self.lock:
+            key = (file_path, page_number)
+            frame = self.frames.get(key)
+            if frame is not None:
+                frame.data[:] = bytes(len(frame.data))
+                if key in self.lru:
+                    self.lru.move_to_end(key)
+                return frame.data
+
+            if page_number == FILE_HEADER_PAGE:
+                offset, size = 0, header_size
+            else:
+                offset, size = header_size + page_number * page_size, page_size
+            data = bytearray(size)
+            self.frames[key] = Frame(data, offset)
+            self.lru[key] = None
+            self.used += size
+            self._evict()
+            return data
+
+    def mark_dirty(self, file_path: str, page_number: int) -> None:
+        """
+        Mark a cached page as modified, so it is written back to disk.
+        :param file_path: Path of the file.
+        :param page_number: Page number in the file, or FILE_HEADER_PAGE for the file header.
+        """
+        with self.lock:
+            key = (file_path, page_number)
+            frame = self.frames[key]
+            frame.dirty = True
+            if self.wal is not None and key not in self.uncommitted:
+                self.uncommitted.add(key)
+                self.uncommitted_size += len(frame.data)
+                del self.lru[key] # pinned until the next commit
+
+    def _write_back(self, file_path: str, frame: Frame) -> None:
+        if self.wal is not None and frame.lsn > self.wal.synced_lsn:
+            self.wal.sync() # the log records of the page must reach the disk before the page does
+        f = self._handle(file_path)
+        f.seek(frame.offset)
+        f.write(frame.data)
+        if stats.enabled:
+            stats.add("pages_written")
+            stats.add("bytes_written", len(frame.data))
+        frame.dirty = False
+        self.unsynced_files.add(file_path)
+
+    def _evict(self) -> None:
+        # the most recently used page is never evicted, so callers can always modify the page they just got.
+        # pinned pages are not in the LRU order, so each evicted page is found in constant time
+        while self.used > self.capacity and len(self.lru) > 1:
+            key, _ = self.lru.popitem(last=False)
+            frame = self.frames.pop(key)
+            if frame.dirty:
+                self._write_back(key[0], frame)
+            self.used -= self._frame_size(frame)
+
+    def _frame_size(self, frame: Frame) -> int:
+        return len(frame.data) + (len(frame.image) if frame.image is not None else 0)
+
+    def keep_image(self, key: Tuple[str, int]) -> None:
+        """
+        Keep a copy of the current contents of a page, which the write-ahead log compares the next changes against.
+        The copy counts towards the memory budget.
+        :param key: (file path, page number) of the page.
+        """
+        with self.lock:
+            frame = self.frames[key]
+            if frame.image is None:
+                self.used += len(frame.data)
+            frame.image = bytes(frame.data)
+
+    def drop_images(self) -> None:
+        """
+        Drop the copies kept by keep_image(), so the next change of each page is logged as the whole page.
+        """
+        with self.lock:
+            for frame in self.frames.values():
+                if frame.image is not None:
+                    self.used -= len(frame.image)
+                    frame.image = None
+
+    def release_uncommitted(self) -> None:
+        """
+        Unpin the pages modified since the last commit, once the write-ahead log has recorded their changes, and evict
+        pages if the pool is over its budget.
+        """
+        with self.lock:
+            for key in self.uncommitted:
+                self.lru[key] = None
+            self.uncommitted.clear()
+            self.uncommitted_size = 0
+            self._evict()
+
+    def commit_if_full(self) -> None:
+        """
+        Commit the write-ahead log if the pinned pages take more than half of the memory budget.
+        Called by operations made of independent steps, such as batch inserts, between two steps, where the tables are
+        consistent and a crash may keep the steps committed so far.
+        """
+        with self.lock:
+            if self.wal is not None and self.uncommitted_size > self.capacity // 2:
+                self.wal.commit()
+
+    def set_capacity(self, capacity: int) -> None:
+        """
+        Change the memory budget of the pool, evicting pages if needed.
+        :param capacity: Memory budget for cached pages, in bytes.
+        """
+        with self.lock:
+            self.capacity = capacity
+            self._evict()
+
+    def has_uncommitted(self, file_path: str) -> bool:
+        """
+        :param file_path: Path of the file.
+        :return: True if pages of the file were modified since the last commit, so flush() cannot bring it up to date.
+        """
+        with self.lock:
+            return any(key[0] == file_path for key in self.uncommitted)
+
+    def flush(self, file_path: Optional[str] = None) -> None:
+        """
+        Write all modified pages back to disk, keeping them cached.
+        Pages modified since the last commit of the write-ahead log, if one is attached, are not written.
+        :param file_path: If given, only the pages of this file are written back.
+        """
+        with self.lock:
+            for key, frame in self.frames.items():
+                if frame.dirty and (file_path is None or key[0] == file_path) and key not in self.uncommitted:
+                    self._write_back(key[0], frame)
+            for handle_file_path, handle in self.handles.items():
+                if file_path is None or handle_file_path == file_path:
+                    handle.flush()
+
+    def discard(self, file_path: str) -> None:
+        """
+        Drop all cached pages of a file without writing them back, and close its handle.
+        Used before a file is rewritten, truncated or removed outside the pool.
+        :param file_path: Path of the file.
+        """
+        with self.lock:
+            for key in [key for key in self.frames if key[0] == file_path]:
+                frame = self.frames.pop(key)
+                self.used -= self._frame_size(frame)
+                self.lru.pop(key, None)
+                if key in self.uncommitted:
+                    self.uncommitted.remove(key)
+                    self.uncommitted_size -= len(frame.data)
+            handle = self.handles.pop(file_path, None)
+            if handle is not None:
+                handle.close()
+            self.unsynced_files.discard(file_path)
+
+    def sync_files(self) -> None:
+        """
+        Make the pages written back so far durable, by syncing the files they were written to.
+        """
+        with self.lock:
+            for file_path in self.unsynced_files:
+                if os.path.exists(file_path):
+                    handle = self._handle(file_path)
+                    handle.flush()
+                    os.fsync(handle.fileno())
+            self.unsynced_files.clear()
+
+    def close(self) -> None:
+        """
+        Write all modified pages back to disk and close all file handles.
+        """
+        with self.lock:
+            self.flush()
+            for handle in self.handles.values():
+                handle.close()
+            self.handles.clear()
+
+
+# buffer pool shared by all tables
+buffer_pool = BufferPool()
+atexit.register(buffer_pool.close)
@@ -0,0 +1,58 @@
+import time
+from typing import List
+
+
+class BufferedWriter:
+    def __init__(self, file_path: str, max_buffer_size: int = 64 * 1024, max_delay: float = 1.0, strict: bool = False):
+        """
+        Initialize a writer appending lines to a text file through a long-lived handle.
+        Lines are collected in memory and written together once the buffered size or the time since the last flush
+        exceeds its threshold, when flush() is called, and when the writer is closed.
+        :param file_path: Path of the file, it is created when the first line is written.
+        :param max_buffer_size: Number of buffered characters that triggers a flush.
+        :param max_delay: Number of seconds after the last flush that triggers a flush on the next write.
+        :param strict: If True, every line is flushed to the file as soon as it is written.
+        """
+        self.file_path = file_path
+        self.max_buffer_size = max_buffer_size
+        self.max_delay = max_delay
+        self.strict = strict
+
+        self.pending: List[str] = []
+        self.pending_size = 0
+        self.last_flush = time.monotonic()
+        self.handle = None
+
+    def write(self, line: str) -> None:
+        """
+        Append a line to the file.
+        :param line: The line, including its line break.
+        """
+        self.pending.append(line)
+        self.pending_size += len(line)
+        if (self.strict or self.pending_size >= self.max_buffer_size
+                or time.monotonic() - self.last_flush >= self.max_delay):
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Write the buffered lines to the file.
+        """
+        self.last_flush = time.monotonic()
+        if not self.pending:
+            return
+        if self.handle is None:
+            self.handle = open(self.file_path, 'a')
+        self.handle.write("".join(self.pending))
+        self.handle.flush()
+        self.pending.clear()
+        self.pending_size = 0
+
+    def close(self) -> None:
+        """
+        Write the buffered lines to the file and close its handle.
+        """
+        self.flush()
+        if self.handle is not None:
+            self.handle.close()
+            self.handle = None
@@ -0,0 +1,160 @@
+import atexit
+import json
+import threading
+from typing import Dict, Optional, Tuple
+from DBMS.Stats import stats
+from DBMS.utils import load_catalog, save_catalog, catalog_file_lock
+
+
+class Catalog:
+    def __init__(self):
+        """
+        Initialize a catalog manager for a session.
+        The catalog file is read once, on first use, and the entries are served from memory afterwards.
+        Table objects are cached as well, so each table is loaded once per session.
+        Changes are kept in memory and written to the catalog file by flush(), at checkpoints and at exit.
+        Only the entries changed by this session are written, so sessions of other processes can change other entries
+        of the same catalog in the meantime, see archive.main_parallel().
+        """
+        self.entries: Optional[Dict[str, dict]] = None
+        self.tables = {}
+        self.tables_lock = threading.Lock() # a table is loaded once even if commands running in parallel request it
+        self.flushed_entries: Dict[str, str] = {} # serialized entries as of the last load or flush
+
+        self.wal = None # write-ahead log the changes are committed to, see DBMS/WriteAheadLog.py
+        self.uncommitted = set() # keys of the entries changed since the last commit of the write-ahead log
+
+    def _load(self) -> Dict[str, dict]:
+        if self.entries is None:
+            self.entries = load_catalog()
+            self.flushed_entries = {entry_key: json.dumps(entry, sort_keys=True) for entry_key, entry in self.entries.items()}
+        return self.entries
+
+    def flush(self) -> bool:
+        """
+        Write the entries changed since the catalog was last loaded or written to the catalog file.
+        Tables modify their entries in place, so changes are detected by comparing the serialized entries. The other
+        entries are read back from the file under a lock and kept as they are there.
+        Changes not yet committed to the write-ahead log, if one is attached, are never written, so nothing is written
+        while there are any. Entries of tables being rewritten are written as they were before the rewrite until the
+        new files are complete, see Table._rewrite().
+        :return: True if the catalog file was written, False if nothing changed.
+        """
+        if self.entries is None or self.uncommitted:
+            return False
+        changed_entries = {}
+        written_entries = {}
+        for entry_key, entry in self.entries.items():
+            rewrite = entry.get("rewrite")
+            if rewrite is not None and rewrite["state"] == "started":
+                entry = dict(rewrite["entry"], rewrite=rewrite) # the entry is modified along with the files
+            content = json.dumps(entry, sort_keys=True)
+            if self.flushed_entries.get(entry_key) != content:
+                changed_entries[entry_key] = content
+                written_entries[entry_key] = entry
+        deleted_keys = [entry_key for entry_key in self.flushed_entries if entry_key not in self.entries]
+        if not changed_entries and not deleted_keys:
+            return False
+
+        with catalog_file_lock():
+            file_entries = load_catalog()
+            file_entries.update(written_entries)
+            for entry_key in deleted_keys:
+                file_entries.pop(entry_key, None)
+            save_catalog(file_entries)
+        if stats.enabled:
+            stats.add("catalog_flushes")
+        self.flushed_entries.update(changed_entries)
+        for entry_key in deleted_keys:
+            del self.flushed_entries[entry_key]
+        return True
+
+    def get_entry(self, entry_key: str) -> Optional[dict]:
+        """
+        Get a specific entry of the catalog.
+        :param entry_key: The key of the entry.
+        :return: The catalog entry if found, otherwise None.
+        """
+        if stats.enabled:
+            stats.add("catalog_reads")
+        return self._load().get(entry_key)
+
+    def save_entry(self, entry_key: str, entry_value: dict) -> None:
+        """
+        Save a specific entry to the catalog, it is written to the catalog file by the next flush().
+        :param entry_key: The key of the entry to save.
+        :param entry_value: The value of the entry to save.
+        """
+        self._load()[entry_key] = entry_value
+        if stats.enabled:
+            stats.add("catalog_writes")
+        if self.wal is not None:
+            self.uncommitted.add(entry_key)
+
+    def delete_entry(self, entry_key: str) -> None:
+        """
+        Delete a specific entry from the catalog, along with the cached table of the entry.
+        :param entry_key: The key of the entry to delete.
+        """
+        self._load().pop(entry_key, None)
+        self.invalidate(entry_key)
+        if stats.enabled:
+            stats.add("catalog_writes")
+        if self.wal is not None:
+            self.uncommitted.add(entry_key)
+
+    def take_changes(self) -> Dict[str, Optional[dict]]:
+        """
+        Get the entries changed since the last call, to be committed to the write-ahead log.
+        :return: A copy of each changed entry, or None for deleted entries.
+        """
+        entries = self._load()
+        changes = {entry_key: json.loads(json.dumps(entries[entry_key])) if entry_key in entries else None
+                   for entry_key in self.uncommitted}
+        self.uncommitted.clear()
+        return changes
+
+    def get_table(self, table_name: str):
+        """
+        Get the table with the given name, loading it if it is not cached.
+        :param table_name: Name of the table.
+        :return: The Table object, or None if the table does not exist.
+        """
+        from DBMS.Table import Table # imported here since Table uses the catalog as well
+
+        table = self.tables.get(table_name)
+        if table is None:
+            with self.tables_lock:
+                table = self.tables.get(table_name)
+                if table is None:
+                    if self.get_entry(table_name) is None:
+                        return None
+                    table = Table(table_name, catalog=self)
+                    self.tables[table_name] = table
+        return table
+
+    def create_table(self, table_name: str, new_table_args: Tuple[int, int, Dict[str, str], Dict[str, str]]):
+        """
+        Create a new table and cache it.
+        :param table_name: Name of the table to create.
+        :param new_table_args: Arguments required for creating the table, see Table.
+        :return: The created Table object.
+        """
+        from DBMS.Table import Table
+
+        self.invalidate(table_name) # the schema changes, drop any stale Table object
+        table = Table(table_name, new_table_args=new_table_args, catalog=self)
+        self.tables[table_name] = table
+        return table
+
+    def invalidate(self, table_name: str) -> None:
+        """
+        Drop the cached Table object of a table, so it is reloaded from its catalog entry on the next access.
+        :param table_name: Name of the table.
+        """
+        self.tables.pop(table_name, None)
+
+
+# catalog shared by all commands of the session
+catalog = Catalog()
+atexit.register(catalog.flush)
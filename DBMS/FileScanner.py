@@ -0,0 +1,146 @@
+import mmap
+import os
+from typing import Callable, List, Optional, Tuple
+
+try:
+    import numpy as np # optional, used to compare a field of a whole file at once in full table scans
+except ImportError:
+    np = None
+
+
+def field_matcher(value: bytes|int, high: Optional[int] = None) -> Callable[[bytes], bool]:
+    """
+    :param value: A value encoded as by RecordCodec.encode_field(), or the smallest int of a range if high is given.
+    :param high: The largest int of the range.
+    :return: A function telling whether an encoded field, as bytes or a memoryview, has the value or a value in the range.
+    """
+    if high is None:
+        return lambda field: field == value
+    return lambda field: value <= int.from_bytes(field, 'big', signed=True) <= high # int fields are big endian signed
+
+
+class FileScanner:
+    def __init__(self, page_format, file_header_size: int, pages_per_file: int):
+        """
+        Initialize a scanner comparing the fields stored in the heap files of a table, such as the primary keys, reading
+        the files directly rather than through the buffer pool, so modified pages must be written back before a file is
+        scanned. Files are memory mapped. Pages of the fixed format are viewed as fixed stride records, so the fields
+        are compared in place, all at once if NumPy is available. Pages of the slotted format are compared slot by slot.
+        Scanners only hold the geometry of the table, so they can be sent to worker processes, see DBMS/ScanPool.py.
+        :param page_format: Page format of the table, see DBMS/PageFormat.py.
+        :param file_header_size: Size of the page bitmap at the start of each file in bytes.
+        :param pages_per_file: Number of pages in a file.
+        """
+        self.page_format = page_format
+        self.FILE_HEADER_SIZE = file_header_size
+        self.PAGES_PER_FILE = pages_per_file
+
+    def scan(self, file_path: str, encoded_key: bytes, first_page: int = 0, end_page: int = None) -> List[Tuple[int, int]]:
+        """
+        Find the occupied slots of a range of pages of a file holding the given primary key.
+        :param file_path: Path of the heap file.
+        :param encoded_key: The encoded primary key.
+        :param first_page: First page of the range.
+        :param end_page: Page after the last page of the range, defaults to the end of the file.
+        :return: (page number, slot) of the matching records, in order.
+        """
+        return self.scan_field(file_path, self.page_format.codec.pk_idx, encoded_key, None, first_page, end_page)
+
+    def scan_field(self, file_path: str, field_idx: int, value: bytes|int, high: Optional[int] = None,
+                   first_page: int = 0, end_page: int = None) -> List[Tuple[int, int]]:
+        """
+        Find the occupied slots of a range of pages of a file whose field has the given value, or a value in the range
+        from value to high for int fields.
+        :param file_path: Path of the heap file.
+        :param field_idx: Index of the compared field.
+        :param value: The value encoded as by RecordCodec.encode_field(), or the smallest int of the range if high is given.
+        :param high: The largest int of the range.
+        :param first_page: First page of the range.
+        :param end_page: Page after the last page of the range, defaults to the end of the file.
+        :return: (page number, slot) of the matching records, in order.
+        """
+        page_size = self.page_format.page_size
+        file_size = os.path.getsize(file_path)
+        if file_size <= self.FILE_HEADER_SIZE:
+            return []
+        # the last page might be cut short, pages are only written up to their last modified byte by older versions
+        page_count = min(self.PAGES_PER_FILE, -(-(file_size - self.FILE_HEADER_SIZE) // page_size))
+        full_page_count = min(page_count, (file_size - self.FILE_HEADER_SIZE) // page_size)
+        end_page = page_count if end_page is None else min(end_page, page_count)
+        if first_page >= end_page:
+            return []
+
+        matches_field = field_matcher(value, high)
+        with open(file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            file_bitmap = int.from_bytes(mm[:self.FILE_HEADER_SIZE], 'big')
+            if self.page_format.name != "fixed":
+                return self._slotted_scan(mm, range(first_page, end_page), file_bitmap, field_idx, matches_field)
+            if np is not None:
+                vectorized_end = max(first_page, min(end_page, full_page_count))
+                matches = self._vectorized_scan(mm, first_page, vectorized_end, file_bitmap, field_idx, value, high)
+                matches += self._strided_scan(mm, range(vectorized_end, end_page), file_bitmap, field_idx, matches_field)
+            else:
+                matches = self._strided_scan(mm, range(first_page, end_page), file_bitmap, field_idx, matches_field)
+        return matches
+
+    def _slotted_scan(self, mm: mmap.mmap, page_numbers: range, file_bitmap: int, field_idx: int,
+                      matches_field: Callable[[bytes], bool]) -> List[Tuple[int, int]]:
+        matches = []
+        page_size = self.page_format.page_size
+        for page_number in page_numbers:
+            if not file_bitmap & (1 << page_number):
+                continue
+            page_offset = self.FILE_HEADER_SIZE + page_number * page_size
+            page = mm[page_offset:page_offset + page_size].ljust(page_size, b'\x00')
+            for slot in self.page_format.occupied_slots(page):
+                if matches_field(self.page_format.field_at(page, slot, field_idx)):
+                    matches.append((page_number, slot))
+        return matches
+
+    def _strided_scan(self, mm: mmap.mmap, page_numbers: range, file_bitmap: int, field_idx: int,
+                      matches_field: Callable[[bytes], bool]) -> List[Tuple[int, int]]:
+        matches = []
+        page_format = self.page_format
+        field_offset, field_size = page_format.codec.offsets[field_idx], page_format.codec.field_sizes[field_idx]
+        view = memoryview(mm)
+        try:
+            for page_number in page_numbers:
+                if not file_bitmap & (1 << page_number):
+                    continue
+                page_offset = self.FILE_HEADER_SIZE + page_number * page_format.page_size
+                page_bitmap = int.from_bytes(view[page_offset:page_offset + page_format.page_header_size], 'big')
+                for slot in range(page_format.page_slots):
+                    value_offset = page_offset + page_format.slot_offset(slot) + field_offset
+                    if page_bitmap & (1 << slot) and matches_field(view[value_offset:value_offset + field_size]):
+                        matches.append((page_number, slot))
+        finally:
+            view.release() # the map cannot be closed while a view of it exists
+        return matches
+
+    def _vectorized_scan(self, mm: mmap.mmap, first_page: int, end_page: int, file_bitmap: int, field_idx: int,
+                         value: bytes|int, high: Optional[int]) -> List[Tuple[int, int]]:
+        if first_page >= end_page:
+            return []
+        page_format = self.page_format
+        codec = page_format.codec
+        page_count = end_page - first_page
+        first_page_offset = self.FILE_HEADER_SIZE + first_page * page_format.page_size
+        # the field of every slot as a (page, slot) array, and the page headers as a (page, header byte) array. Ranges
+        # view int fields as big endian integers, values are compared as raw bytes
+        field_type = f'S{codec.field_sizes[field_idx]}' if high is None else '>i4'
+        fields = np.ndarray((page_count, page_format.page_slots), dtype=field_type, buffer=mm,
+                            offset=first_page_offset + page_format.page_header_size + codec.offsets[field_idx],
+                            strides=(page_format.page_size, page_format.entry_size))
+        page_headers = np.ndarray((page_count, page_format.page_header_size), dtype=np.uint8, buffer=mm,
+                                  offset=first_page_offset, strides=(page_format.page_size, 1))
+        try:
+            # bitmaps are big endian integers where bit i is slot (or page) i, so reverse the bytes to unpack them in order
+            slot_mask = np.unpackbits(page_headers[:, ::-1], axis=1, bitorder='little')[:, :page_format.page_slots].astype(bool)
+            file_header = np.frombuffer(file_bitmap.to_bytes(self.FILE_HEADER_SIZE, 'big')[::-1], dtype=np.uint8)
+            page_mask = np.unpackbits(file_header, bitorder='little')[first_page:end_page].astype(bool)
+
+            field_mask = (fields == value) if high is None else (fields >= value) & (fields <= high)
+            matches = field_mask & slot_mask & page_mask[:, None]
+            return [(first_page + int(page_number), int(slot)) for page_number, slot in np.argwhere(matches)]
+        finally:
+            del fields, page_headers # the map cannot be closed while an array uses it as its buffer
@@ -0,0 +1,110 @@
+import os
+from typing import List, Optional, Tuple
+from DBMS.BufferPool import buffer_pool
+
+
+class FreeSpaceMap:
+    def __init__(self, file_path: str, pages_per_file: int, file_count: int):
+        """
+        Initialize a persistent free space map of a table.
+        The map keeps one bitmap per heap file, where a set bit means that the page still has room for a record.
+        Bitmaps are kept in memory as well, so finding a page to insert into never reads the heap files.
+
+        File Structure: [ bitmap of file 1 | bitmap of file 2 | ... ]
+
+        :param file_path: Path of the free space map file, it is created if it does not exist.
+        :param pages_per_file: Number of pages in each heap file.
+        :param file_count: Number of heap files of the table.
+        """
+        self.file_path = file_path
+        self.pages_per_file = pages_per_file
+        self.BITMAP_SIZE = (pages_per_file + 7) // 8
+        self.ALL_FREE = (1 << pages_per_file) - 1
+
+        if not os.path.exists(file_path):
+            open(file_path, 'wb')
+
+        # the bitmap of each heap file is a page of the map file
+        self.bitmaps = [int.from_bytes(self._read_bitmap(position), 'big') for position in range(file_count)]
+
+        # lowest position in self.bitmaps that might have a free page, every bitmap before it is known to be zero
+        self.first_free = 0
+        self._advance_first_free()
+
+    def _advance_first_free(self) -> None:
+        while self.first_free < len(self.bitmaps) and self.bitmaps[self.first_free] == 0:
+            self.first_free += 1
+
+    def _read_bitmap(self, position: int) -> bytearray:
+        return buffer_pool.get_page(self.file_path, position, self.BITMAP_SIZE)
+
+    def _write_bitmap(self, position: int) -> None:
+        self._read_bitmap(position)[:] = self.bitmaps[position].to_bytes(self.BITMAP_SIZE, 'big')
+        buffer_pool.mark_dirty(self.file_path, position)
+
+    def find_free_page(self, file_indices: List[int] = None) -> Optional[Tuple[int, int]]:
+        """
+        Find the first page with room for a record, in the order of file index and then page number.
+        :param file_indices: If given, only the pages of these files are considered, in the given order.
+        :return: A tuple of the file index and page number of the page, or None if every page of every file is full.
+        """
+        if file_indices is not None:
+            for file_index in file_indices:
+                bitmap = self.bitmaps[file_index - 1]
+                if bitmap:
+                    return file_index, (bitmap & -bitmap).bit_length() - 1
+            return None
+
+        if self.first_free >= len(self.bitmaps):
+            return None
+        bitmap = self.bitmaps[self.first_free]
+        page_number = (bitmap & -bitmap).bit_length() - 1 # lowest set bit
+        return self.first_free + 1, page_number
+
+    def add_file(self) -> int:
+        """
+        Register a new, empty heap file, with all of its pages free.
+        :return: File index of the new file.
+        """
+        self.bitmaps.append(self.ALL_FREE)
+        position = len(self.bitmaps) - 1
+        self.first_free = min(self.first_free, position)
+        self._write_bitmap(position)
+        return position + 1
+
+    def mark_full(self, file_index: int, page_number: int) -> None:
+        """
+        Mark a page as having no room for a record.
+        :param file_index: Index of the file of the page.
+        :param page_number: Page number in the file.
+        """
+        position = file_index - 1
+        if not self.bitmaps[position] & (1 << page_number):
+            return
+        self.bitmaps[position] &= ~(1 << page_number)
+        self._write_bitmap(position)
+        self._advance_first_free()
+
+    def mark_free(self, file_index: int, page_number: int) -> None:
+        """
+        Mark a page as having room for a record.
+        :param file_index: Index of the file of the page.
+        :param page_number: Page number in the file.
+        """
+        position = file_index - 1
+        if self.bitmaps[position] & (1 << page_number):
+            return
+        self.bitmaps[position] |= (1 << page_number)
+        self._write_bitmap(position)
+        self.first_free = min(self.first_free, position)
+
+    def reset(self, file_count: int) -> None:
+        """
+        Reset the map to the given number of files, with all pages free.
+        :param file_count: Number of heap files of the table.
+        """
+        self.bitmaps = [self.ALL_FREE] * file_count
+        self.first_free = 0
+        # bitmaps beyond the file count are never read, add_file() writes them when they are used again
+        for position in range(file_count):
+            self._write_bitmap(position)
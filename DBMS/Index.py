@@ -0,0 +1,449 @@
+import bisect
+import os
+import zlib
+from typing import List, Tuple
+from DBMS.BufferPool import buffer_pool, FILE_HEADER_PAGE
+
+# A record location: (file index, page number, slot index). File indexes are 1-based, matching `<table_name>_<file_index>.bat`.
+RecordId = Tuple[int, int, int]
+
+
+class HashIndex:
+    def __init__(self, file_path: str):
+        """
+        Initialize a persistent hash index stored in a single file.
+        The index maps the hash of a key to the locations of the records having that key. Only the hash is stored, so
+        callers must verify a candidate location by reading the record and comparing the actual key.
+
+        File Structure: [ file header | bucket 0 | bucket 1 | ... | overflow pages ]
+        File Header: [ bucket count (4) | entry count (4) | page count (4) ], padded to INDEX_PAGE_SIZE
+        Bucket Page: [ entry count (2) | next overflow page (4) | entry 0 | entry 1 | ... ]
+        Entry: [ key hash (4) | file index (4) | page number (4) | slot (2) ]
+
+        :param file_path: Path of the index file, it is created if it does not exist.
+        """
+
+        # constants
+        self.INDEX_PAGE_SIZE = 4096
+        self.INDEX_HEADER_SIZE = 12
+        self.BUCKET_HEADER_SIZE = 6 # 2 bytes for entry count, 4 bytes for the next overflow page number (0 if none)
+        self.ENTRY_SIZE = 14
+        self.ENTRIES_PER_PAGE = (self.INDEX_PAGE_SIZE - self.BUCKET_HEADER_SIZE) // self.ENTRY_SIZE
+        self.INITIAL_BUCKET_COUNT = 64
+        self.MAX_LOAD_FACTOR = 0.75 # double the bucket count when the buckets are filled more than this on average
+
+        self.file_path = file_path
+        self.page_count = 0
+        if not os.path.exists(file_path):
+            open(file_path, 'wb')
+            self._initialize(self.INITIAL_BUCKET_COUNT)
+
+        header = self._read_header()
+        self.bucket_count = int.from_bytes(header[0:4], 'big')
+        self.entry_count = int.from_bytes(header[4:8], 'big')
+        self.page_count = int.from_bytes(header[8:12], 'big') # pages after the header, including overflow pages
+
+    def _initialize(self, bucket_count: int) -> None:
+        # rewrite the pages through the buffer pool, so the change is logged like any other. empty buckets are all
+        # zeroes, and so must be the old pages beyond them, since new overflow pages are expected to be all zeroes
+        header = buffer_pool.create_page(self.file_path, FILE_HEADER_PAGE, self.INDEX_PAGE_SIZE, self.INDEX_PAGE_SIZE)
+        header[:] = self._encode_header(bucket_count, 0, bucket_count)
+        self._mark_dirty(FILE_HEADER_PAGE)
+        for page_number in range(max(bucket_count, self.page_count)):
+            buffer_pool.create_page(self.file_path, page_number, self.INDEX_PAGE_SIZE, self.INDEX_PAGE_SIZE)
+            self._mark_dirty(page_number)
+
+    def _encode_header(self, bucket_count: int, entry_count: int, page_count: int) -> bytes:
+        header = (bucket_count.to_bytes(4, 'big')
+                  + entry_count.to_bytes(4, 'big')
+                  + page_count.to_bytes(4, 'big'))
+        return header.ljust(self.INDEX_PAGE_SIZE, b'\x00')
+
+    @staticmethod
+    def hash_key(key: bytes) -> int:
+        # crc32 is stable across processes, unlike the builtin hash() of str/bytes
+        return zlib.crc32(key)
+
+    def _read_header(self) -> bytearray:
+        return buffer_pool.get_page(self.file_path, FILE_HEADER_PAGE, self.INDEX_PAGE_SIZE, self.INDEX_PAGE_SIZE)
+
+    def _read_page(self, page_number: int) -> bytearray:
+        # page 0 is right after the header, the returned page is cached in the buffer pool and can be modified in place
+        return buffer_pool.get_page(self.file_path, page_number, self.INDEX_PAGE_SIZE, self.INDEX_PAGE_SIZE)
+
+    def _mark_dirty(self, page_number: int) -> None:
+        buffer_pool.mark_dirty(self.file_path, page_number)
+
+    def _write_header(self) -> None:
+        header = self._read_header()
+        header[:] = self._encode_header(self.bucket_count, self.entry_count, self.page_count)
+        self._mark_dirty(FILE_HEADER_PAGE)
+
+    def _decode_entry(self, page: bytes, entry_idx: int) -> Tuple[int, RecordId]:
+        offset = self.BUCKET_HEADER_SIZE + entry_idx * self.ENTRY_SIZE
+        key_hash = int.from_bytes(page[offset:offset + 4], 'big')
+        file_index = int.from_bytes(page[offset + 4:offset + 8], 'big')
+        page_number = int.from_bytes(page[offset + 8:offset + 12], 'big')
+        slot = int.from_bytes(page[offset + 12:offset + 14], 'big')
+        return key_hash, (file_index, page_number, slot)
+
+    def _encode_entry(self, key_hash: int, rid: RecordId) -> bytes:
+        file_index, page_number, slot = rid
+        return (key_hash.to_bytes(4, 'big')
+                + file_index.to_bytes(4, 'big')
+                + page_number.to_bytes(4, 'big')
+                + slot.to_bytes(2, 'big'))
+
+    def lookup(self, key: bytes) -> List[RecordId]:
+        """
+        Find the locations of all records whose key hashes to the same value as the given key.
+        :param key: The encoded key.
+        :return: Candidate record locations, the caller must check the actual key stored at each of them.
+        """
+        key_hash = self.hash_key(key)
+        hash_bytes = key_hash.to_bytes(4, 'big')
+        candidates = []
+        page_number = key_hash % self.bucket_count
+        while True:
+            page = self._read_page(page_number)
+            count = int.from_bytes(page[0:2], 'big')
+            # find the hash in the page rather than decoding every entry, a match must be at the start of an entry
+            entries_end = self.BUCKET_HEADER_SIZE + count * self.ENTRY_SIZE
+            offset = page.find(hash_bytes, self.BUCKET_HEADER_SIZE, entries_end)
+            while offset != -1:
+                entry_idx, misalignment = divmod(offset - self.BUCKET_HEADER_SIZE, self.ENTRY_SIZE)
+                if misalignment == 0:
+                    candidates.append(self._decode_entry(page, entry_idx)[1])
+                offset = page.find(hash_bytes, offset + 1, entries_end)
+            page_number = int.from_bytes(page[2:6], 'big')
+            if page_number == 0: # bucket pages are never overflow pages, so 0 marks the end of the chain
+                break
+        return candidates
+
+    def insert(self, key: bytes, rid: RecordId) -> None:
+        """
+        Add an entry for a record to the index.
+        :param key: The encoded key of the record.
+        :param rid: Location of the record.
+        """
+        if self.entry_count + 1 > self.MAX_LOAD_FACTOR * self.bucket_count * self.ENTRIES_PER_PAGE:
+            self._resize(self.bucket_count * 2)
+
+        self._insert_entry(self.hash_key(key), rid)
+        self.entry_count += 1
+        self._write_header()
+
+    def _insert_entry(self, key_hash: int, rid: RecordId) -> None:
+        # walk to the last page of the bucket's chain, appending an overflow page if that one is full
+        page_number = key_hash % self.bucket_count
+        page = self._read_page(page_number)
+        while int.from_bytes(page[2:6], 'big') != 0:
+            page_number = int.from_bytes(page[2:6], 'big')
+            page = self._read_page(page_number)
+
+        count = int.from_bytes(page[0:2], 'big')
+        if count >= self.ENTRIES_PER_PAGE:
+            new_page_number = self.page_count
+            self.page_count += 1
+            page[2:6] = new_page_number.to_bytes(4, 'big')
+            self._mark_dirty(page_number)
+            page_number, count = new_page_number, 0
+            page = self._read_page(page_number) # beyond the end of the file, so all zeroes
+
+        offset = self.BUCKET_HEADER_SIZE + count * self.ENTRY_SIZE
+        page[offset:offset + self.ENTRY_SIZE] = self._encode_entry(key_hash, rid)
+        page[0:2] = (count + 1).to_bytes(2, 'big')
+        self._mark_dirty(page_number)
+
+    def delete(self, key: bytes, rid: RecordId) -> bool:
+        """
+        Remove the entry of a record from the index.
+        :param key: The encoded key of the record.
+        :param rid: Location of the record.
+        :return: True if the entry was found and removed, False otherwise.
+        """
+        key_hash = self.hash_key(key)
+        page_number = key_hash % self.bucket_count
+        while True:
+            page = self._read_page(page_number)
+            count = int.from_bytes(page[0:2], 'big')
+            for entry_idx in range(count):
+                if self._decode_entry(page, entry_idx) == (key_hash, rid):
+                    # move the last entry of the page into the freed position
+                    offset = self.BUCKET_HEADER_SIZE + entry_idx * self.ENTRY_SIZE
+                    last_offset = self.BUCKET_HEADER_SIZE + (count - 1) * self.ENTRY_SIZE
+                    page[offset:offset + self.ENTRY_SIZE] = page[last_offset:last_offset + self.ENTRY_SIZE]
+                    page[last_offset:last_offset + self.ENTRY_SIZE] = bytes(self.ENTRY_SIZE)
+                    page[0:2] = (count - 1).to_bytes(2, 'big')
+                    self._mark_dirty(page_number)
+                    self.entry_count -= 1
+                    self._write_header()
+                    return True
+            page_number = int.from_bytes(page[2:6], 'big')
+            if page_number == 0:
+                return False
+
+    def entries(self) -> List[Tuple[int, RecordId]]:
+        """
+        :return: All (key hash, record location) entries of the index.
+        """
+        result = []
+        for bucket in range(self.bucket_count):
+            page_number = bucket
+            while True:
+                page = self._read_page(page_number)
+                count = int.from_bytes(page[0:2], 'big')
+                result.extend(self._decode_entry(page, entry_idx) for entry_idx in range(count))
+                page_number = int.from_bytes(page[2:6], 'big')
+                if page_number == 0:
+                    break
+        return result
+
+    def _resize(self, bucket_count: int) -> None:
+        entries = self.entries()
+        self.clear(bucket_count)
+        for key_hash, rid in entries:
+            self._insert_entry(key_hash, rid)
+        self.entry_count = len(entries)
+        self._write_header()
+
+    def clear(self, bucket_count: int = None) -> None:
+        """
+        Remove all entries from the index.
+        :param bucket_count: Number of buckets of the emptied index, defaults to the initial bucket count.
+        """
+        if bucket_count is None:
+            bucket_count = self.INITIAL_BUCKET_COUNT
+        self._initialize(bucket_count)
+        self.bucket_count = bucket_count
+        self.entry_count = 0
+        self.page_count = bucket_count
+
+
+class Node:
+    """A decoded page of a SortedIndex: the keys of a leaf, or the separator keys and child pages of an inner node."""
+    def __init__(self, is_leaf: bool, keys: List[bytes], children: List[int], next_leaf: int):
+        self.is_leaf = is_leaf
+        self.keys = keys
+        self.children = children
+        self.next_leaf = next_leaf
+
+
+class SortedIndex:
+    def __init__(self, file_path: str):
+        """
+        Initialize a persistent B+ tree index over an int field, stored in a single file.
+        Entries are ordered by the value of the field and then by the location of the record, so every entry is unique
+        even if values repeat. Leaves are linked in order, so a range of values is read by descending to its first leaf
+        and following the links. Entries are removed from their leaf without merging underfull nodes, which keeps the
+        tree valid; the pages are only reclaimed when the index is cleared.
+
+        File Structure: [ file header | page 0 | page 1 | ... ]
+        File Header: [ root page (4) | entry count (4) | page count (4) ], padded to INDEX_PAGE_SIZE
+        Leaf Page: [ is leaf (1) | key count (2) | next leaf page (4) | key 0 | key 1 | ... ]
+        Inner Page: [ is leaf (1) | key count (2) | unused (4) | key 1 | ... | key n | child 0 (4) | ... | child n (4) ]
+        Key: [ value (4) | file index (4) | page number (4) | slot (2) ], the value is stored with its sign bit flipped,
+             so keys compare as bytes in the order of their values.
+
+        Child i of an inner page holds the keys from key i up to key i + 1.
+
+        :param file_path: Path of the index file, it is created if it does not exist.
+        """
+
+        # constants
+        self.INDEX_PAGE_SIZE = 4096
+        self.NODE_HEADER_SIZE = 7
+        self.KEY_SIZE = 14
+        self.CHILD_SIZE = 4
+        self.LEAF_CAPACITY = (self.INDEX_PAGE_SIZE - self.NODE_HEADER_SIZE) // self.KEY_SIZE
+        self.INNER_CAPACITY = (self.INDEX_PAGE_SIZE - self.NODE_HEADER_SIZE - self.CHILD_SIZE) // (self.KEY_SIZE + self.CHILD_SIZE)
+        self.NO_NEXT_LEAF = 0xFFFFFFFF
+        self.VALUE_BIAS = 2 ** 31 # added to values so that they are stored as unsigned integers in the same order
+
+        self.file_path = file_path
+        if not os.path.exists(file_path):
+            open(file_path, 'wb')
+            self.clear()
+
+        header = self._read_header()
+        self.root = int.from_bytes(header[0:4], 'big')
+        self.entry_count = int.from_bytes(header[4:8], 'big')
+        self.page_count = int.from_bytes(header[8:12], 'big')
+
+    def _read_header(self) -> bytearray:
+        return buffer_pool.get_page(self.file_path, FILE_HEADER_PAGE, self.INDEX_PAGE_SIZE, self.INDEX_PAGE_SIZE)
+
+    def _write_header(self) -> None:
+        header = self._read_header()
+        header[:] = (self.root.to_bytes(4, 'big')
+                     + self.entry_count.to_bytes(4, 'big')
+                     + self.page_count.to_bytes(4, 'big')).ljust(self.INDEX_PAGE_SIZE, b'\x00')
+        buffer_pool.mark_dirty(self.file_path, FILE_HEADER_PAGE)
+
+    def _encode_key(self, value: int, rid: RecordId) -> bytes:
+        file_index, page_number, slot = rid
+        return ((value + self.VALUE_BIAS).to_bytes(4, 'big')
+                + file_index.to_bytes(4, 'big')
+                + page_number.to_bytes(4, 'big')
+                + slot.to_bytes(2, 'big'))
+
+    def _decode_key(self, key: bytes) -> Tuple[int, RecordId]:
+        return (int.from_bytes(key[0:4], 'big') - self.VALUE_BIAS,
+                (int.from_bytes(key[4:8], 'big'), int.from_bytes(key[8:12], 'big'), int.from_bytes(key[12:14], 'big')))
+
+    def _read_node(self, page_number: int) -> Node:
+        page = buffer_pool.get_page(self.file_path, page_number, self.INDEX_PAGE_SIZE, self.INDEX_PAGE_SIZE)
+        is_leaf = page[0] == 1
+        count = int.from_bytes(page[1:3], 'big')
+        next_leaf = int.from_bytes(page[3:7], 'big')
+        keys_end = self.NODE_HEADER_SIZE + count * self.KEY_SIZE
+        keys = [bytes(page[offset:offset + self.KEY_SIZE]) for offset in range(self.NODE_HEADER_SIZE, keys_end, self.KEY_SIZE)]
+        children = []
+        if not is_leaf:
+            children_start = self.NODE_HEADER_SIZE + self.INNER_CAPACITY * self.KEY_SIZE
+            children = [int.from_bytes(page[offset:offset + self.CHILD_SIZE], 'big')
+                        for offset in range(children_start, children_start + (count + 1) * self.CHILD_SIZE, self.CHILD_SIZE)]
+        return Node(is_leaf, keys, children, next_leaf)
+
+    def _write_node(self, page_number: int, node: Node) -> None:
+        data = bytearray(self.INDEX_PAGE_SIZE)
+        data[0] = 1 if node.is_leaf else 0
+        data[1:3] = len(node.keys).to_bytes(2, 'big')
+        data[3:7] = node.next_leaf.to_bytes(4, 'big')
+        keys = b''.join(node.keys)
+        data[self.NODE_HEADER_SIZE:self.NODE_HEADER_SIZE + len(keys)] = keys
+        if not node.is_leaf:
+            children_start = self.NODE_HEADER_SIZE + self.INNER_CAPACITY * self.KEY_SIZE
+            children = b''.join(child.to_bytes(self.CHILD_SIZE, 'big') for child in node.children)
+            data[children_start:children_start + len(children)] = children
+        page = buffer_pool.get_page(self.file_path, page_number, self.INDEX_PAGE_SIZE, self.INDEX_PAGE_SIZE)
+        page[:] = data
+        buffer_pool.mark_dirty(self.file_path, page_number)
+
+    def _allocate_page(self) -> int:
+        # new pages are never read from disk, the file might still hold pages of the index before it was cleared
+        page_number = self.page_count
+        self.page_count += 1
+        buffer_pool.create_page(self.file_path, page_number, self.INDEX_PAGE_SIZE, self.INDEX_PAGE_SIZE)
+        return page_number
+
+    def _descend(self, key: bytes) -> Tuple[int, Node, List[Tuple[int, Node, int]]]:
+        # find the leaf a key belongs to, along with the (page number, node, child position) of the inner nodes above it
+        path = []
+        page_number = self.root
+        node = self._read_node(page_number)
+        while not node.is_leaf:
+            child_position = bisect.bisect_right(node.keys, key)
+            path.append((page_number, node, child_position))
+            page_number = node.children[child_position]
+            node = self._read_node(page_number)
+        return page_number, node, path
+
+    def insert(self, value: int, rid: RecordId) -> None:
+        """
+        Add an entry for a record to the index.
+        :param value: Value of the indexed field of the record.
+        :param rid: Location of the record.
+        """
+        key = self._encode_key(value, rid)
+        page_number, leaf, path = self._descend(key)
+        bisect.insort(leaf.keys, key)
+
+        split = None # (first key of the new right node, its page number) to be added to the parent
+        if len(leaf.keys) > self.LEAF_CAPACITY:
+            middle = len(leaf.keys) // 2
+            right_page_number = self._allocate_page()
+            self._write_node(right_page_number, Node(True, leaf.keys[middle:], [], leaf.next_leaf))
+            split = (leaf.keys[middle], right_page_number)
+            leaf.keys = leaf.keys[:middle]
+            leaf.next_leaf = right_page_number
+        self._write_node(page_number, leaf)
+
+        while split is not None and path:
+            page_number, node, child_position = path.pop()
+            separator, right_page_number = split
+            node.keys.insert(child_position, separator)
+            node.children.insert(child_position + 1, right_page_number)
+            split = None
+            if len(node.keys) > self.INNER_CAPACITY:
+                # the middle key moves up to the parent, it separates the two halves there
+                middle = len(node.keys) // 2
+                right_page_number = self._allocate_page()
+                self._write_node(right_page_number, Node(False, node.keys[middle + 1:], node.children[middle + 1:], 0))
+                split = (node.keys[middle], right_page_number)
+                node.keys = node.keys[:middle]
+                node.children = node.children[:middle + 1]
+            self._write_node(page_number, node)
+
+        if split is not None: # the root was split, the tree grows by a level
+            separator, right_page_number = split
+            new_root = self._allocate_page()
+            self._write_node(new_root, Node(False, [separator], [self.root, right_page_number], 0))
+            self.root = new_root
+
+        self.entry_count += 1
+        self._write_header()
+
+    def delete(self, value: int, rid: RecordId) -> bool:
+        """
+        Remove the entry of a record from the index.
+        :param value: Value of the indexed field of the record.
+        :param rid: Location of the record.
+        :return: True if the entry was found and removed, False otherwise.
+        """
+        key = self._encode_key(value, rid)
+        page_number, leaf, _ = self._descend(key)
+        position = bisect.bisect_left(leaf.keys, key)
+        if position == len(leaf.keys) or leaf.keys[position] != key:
+            return False
+        del leaf.keys[position]
+        self._write_node(page_number, leaf)
+        self.entry_count -= 1
+        self._write_header()
+        return True
+
+    def range(self, low: int, high: int) -> List[Tuple[int, RecordId]]:
+        """
+        Find the entries whose value is in a range.
+        :param low: Smallest value of the range.
+        :param high: Largest value of the range.
+        :return: (value, record location) of the entries in the range, in the order of value and then location.
+        """
+        low = max(low, -self.VALUE_BIAS)
+        high = min(high, self.VALUE_BIAS - 1)
+        if low > high:
+            return []
+        low_key = self._encode_key(low, (0, 0, 0))
+        high_value = (high + self.VALUE_BIAS).to_bytes(4, 'big')
+
+        result = []
+        _, leaf, _ = self._descend(low_key)
+        position = bisect.bisect_left(leaf.keys, low_key)
+        while True:
+            for key in leaf.keys[position:]:
+                if key[0:4] > high_value:
+                    return result
+                result.append(self._decode_key(key))
+            if leaf.next_leaf == self.NO_NEXT_LEAF:
+                return result
+            leaf = self._read_node(leaf.next_leaf)
+            position = 0
+
+    def lookup(self, value: int) -> List[RecordId]:
+        """
+        Find the locations of the records having a value.
+        :param value: The value of the indexed field.
+        :return: Record locations, in order.
+        """
+        return [rid for _, rid in self.range(value, value)]
+
+    def clear(self) -> None:
+        """
+        Remove all entries from the index.
+        """
+        self.page_count = 0
+        self.entry_count = 0
+        self.root = self._allocate_page()
+        self._write_node(self.root, Node(True, [], [], self.NO_NEXT_LEAF))
+        buffer_pool.create_page(self.file_path, FILE_HEADER_PAGE, self.INDEX_PAGE_SIZE, self.INDEX_PAGE_SIZE)
+        self._write_header()
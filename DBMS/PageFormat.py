@@ -0,0 +1,236 @@
+from typing import Dict, List, Optional, Tuple
+from DBMS.RecordCodec import RecordCodec
+
+PAGE_FORMATS = ("fixed", "slotted")
+
+
+class FixedPageFormat:
+    name = "fixed"
+
+    def __init__(self, codec: RecordCodec, page_size: int, page_slots: int, page_header_size: int):
+        """
+        Page format storing fixed length records in a fixed number of slots.
+        Page Structure: [ bitmap | record 0 | record 1 | ... ], bit i of the bitmap is set if slot i is occupied.
+        :param codec: Codec of the records of the table.
+        :param page_size: Size of a page in bytes.
+        :param page_slots: Number of slots in a page.
+        :param page_header_size: Size of the slot bitmap in bytes.
+        """
+        self.codec = codec
+        self.page_size = page_size
+        self.page_slots = page_slots
+        self.page_header_size = page_header_size
+        self.entry_size = codec.size
+        self.max_records = page_slots
+        self.FULL = (1 << page_slots) - 1
+
+    def bitmap(self, page: bytes) -> int:
+        return int.from_bytes(page[:self.page_header_size], 'big')
+
+    def _set_bitmap(self, page: bytearray, page_bitmap: int) -> None:
+        page[:self.page_header_size] = page_bitmap.to_bytes(self.page_header_size, 'big')
+
+    def slot_offset(self, slot: int) -> int:
+        return self.page_header_size + slot * self.entry_size
+
+    def encode(self, field_values: Tuple[str|int]) -> bytes:
+        return self.codec.encode(field_values)
+
+    def decode(self, entry: bytes) -> Dict[str, str|int]:
+        return self.codec.decode(entry)
+
+    def is_occupied(self, page: bytes, slot: int) -> bool:
+        return slot < self.page_slots and bool(self.bitmap(page) & (1 << slot))
+
+    def occupied_slots(self, page: bytes) -> List[int]:
+        page_bitmap = self.bitmap(page)
+        return [slot for slot in range(self.page_slots) if page_bitmap & (1 << slot)]
+
+    def key_at(self, page: bytes, slot: int) -> bytes:
+        return self.codec.key_at(page, self.slot_offset(slot))
+
+    def field_at(self, page: bytes, slot: int, field_idx: int) -> bytes:
+        return self.codec.field_at(page, self.slot_offset(slot), field_idx)
+
+    def decode_at(self, page: bytes, slot: int) -> Dict[str, str|int]:
+        slot_offset = self.slot_offset(slot)
+        return self.codec.decode(page[slot_offset:slot_offset + self.entry_size])
+
+    def records(self, page: bytes) -> List[Tuple[int, Dict[str, str|int]]]:
+        # decode the occupied slots of the page at once with iter_unpack
+        slots = page[self.page_header_size:self.page_header_size + self.page_slots * self.entry_size]
+        return list(self.codec.decode_many(slots, self.bitmap(page)))
+
+    def insert(self, page: bytearray, entry: bytes) -> Optional[int]:
+        """
+        Write an encoded record to the first available slot of the page.
+        :return: The slot of the record, or None if the page is full.
+        """
+        page_bitmap = self.bitmap(page)
+        if page_bitmap == self.FULL:
+            return None
+        slot = ((~page_bitmap) & (page_bitmap + 1)).bit_length() - 1 # lowest clear bit
+        slot_offset = self.slot_offset(slot)
+        page[slot_offset:slot_offset + self.entry_size] = entry
+        self._set_bitmap(page, page_bitmap | (1 << slot)) # update the page bitmap to mark the slot as filled
+        return slot
+
+    def delete(self, page: bytearray, slot: int) -> None:
+        self._set_bitmap(page, self.bitmap(page) & ~(1 << slot))
+        # clear the entry in the page, isn't strictly necessary after marking the slot as empty but might prevent bugs
+        slot_offset = self.slot_offset(slot)
+        page[slot_offset:slot_offset + self.entry_size] = bytes(self.entry_size)
+
+    def has_room(self, page: bytes) -> bool:
+        return self.bitmap(page) != self.FULL
+
+    def is_empty(self, page: bytes) -> bool:
+        return self.bitmap(page) == 0
+
+
+class SlottedPageFormat:
+    name = "slotted"
+    PAGE_HEADER_SIZE = 4 # 2 bytes for the slot count, 2 bytes for the start of the record area
+    SLOT_ENTRY_SIZE = 4 # 2 bytes for the offset of the record, 2 bytes for its length (0 if the slot is empty)
+    MAX_PAGE_SIZE = 1 << 16 # offsets must fit in 2 bytes
+
+    def __init__(self, codec: RecordCodec, page_size: int):
+        """
+        Page format storing variable length records, where str fields only take as much space as their value.
+        Page Structure: [ slot count | record area start | slot directory | free space | records ]
+        The slot directory grows from the start of the page and the records grow from the end. Each directory entry
+        holds the offset and length of a record, so records can be moved within the page without changing their slot.
+        :param codec: Codec of the records of the table.
+        :param page_size: Size of a page in bytes.
+        """
+        if page_size > self.MAX_PAGE_SIZE:
+            raise ValueError(f"Page size {page_size} exceeds the maximum of {self.MAX_PAGE_SIZE} bytes for the slotted format.")
+        if self.PAGE_HEADER_SIZE + self.SLOT_ENTRY_SIZE + codec.max_variable_size > page_size:
+            raise ValueError(f"Page size {page_size} cannot hold a record of {codec.max_variable_size} bytes in the slotted format.")
+        self.codec = codec
+        self.page_size = page_size
+        self.max_record_size = codec.max_variable_size
+        self.max_records = (page_size - self.PAGE_HEADER_SIZE) // (codec.min_variable_size + self.SLOT_ENTRY_SIZE)
+
+    def _header(self, page: bytes) -> Tuple[int, int]:
+        slot_count = int.from_bytes(page[0:2], 'big')
+        record_area_start = int.from_bytes(page[2:4], 'big') or self.page_size # a new page is all zeroes
+        return slot_count, record_area_start
+
+    def _set_header(self, page: bytearray, slot_count: int, record_area_start: int) -> None:
+        page[0:2] = slot_count.to_bytes(2, 'big')
+        page[2:4] = (record_area_start % self.MAX_PAGE_SIZE).to_bytes(2, 'big')
+
+    def _slot_entry(self, page: bytes, slot: int) -> Tuple[int, int]:
+        entry_offset = self.PAGE_HEADER_SIZE + slot * self.SLOT_ENTRY_SIZE
+        return int.from_bytes(page[entry_offset:entry_offset + 2], 'big'), int.from_bytes(page[entry_offset + 2:entry_offset + 4], 'big')
+
+    def _set_slot_entry(self, page: bytearray, slot: int, offset: int, length: int) -> None:
+        entry_offset = self.PAGE_HEADER_SIZE + slot * self.SLOT_ENTRY_SIZE
+        page[entry_offset:entry_offset + 2] = offset.to_bytes(2, 'big')
+        page[entry_offset + 2:entry_offset + 4] = length.to_bytes(2, 'big')
+
+    def _record(self, page: bytes, slot: int) -> bytes:
+        offset, length = self._slot_entry(page, slot)
+        return page[offset:offset + length]
+
+    def encode(self, field_values: Tuple[str|int]) -> bytes:
+        return self.codec.encode_variable(field_values)
+
+    def decode(self, entry: bytes) -> Dict[str, str|int]:
+        return self.codec.decode_variable(entry)
+
+    def is_occupied(self, page: bytes, slot: int) -> bool:
+        slot_count, _ = self._header(page)
+        return slot < slot_count and self._slot_entry(page, slot)[1] > 0
+
+    def occupied_slots(self, page: bytes) -> List[int]:
+        slot_count, _ = self._header(page)
+        return [slot for slot in range(slot_count) if self._slot_entry(page, slot)[1] > 0]
+
+    def key_at(self, page: bytes, slot: int) -> bytes:
+        return self.codec.variable_key(self._record(page, slot))
+
+    def field_at(self, page: bytes, slot: int, field_idx: int) -> bytes:
+        return self.codec.variable_field(self._record(page, slot), field_idx)
+
+    def decode_at(self, page: bytes, slot: int) -> Dict[str, str|int]:
+        return self.codec.decode_variable(self._record(page, slot))
+
+    def records(self, page: bytes) -> List[Tuple[int, Dict[str, str|int]]]:
+        return [(slot, self.decode_at(page, slot)) for slot in self.occupied_slots(page)]
+
+    def _free_space(self, page: bytes) -> int:
+        # free bytes in total, including the holes left by deleted records
+        slot_count, _ = self._header(page)
+        used = sum(self._slot_entry(page, slot)[1] for slot in range(slot_count))
+        return self.page_size - self.PAGE_HEADER_SIZE - slot_count * self.SLOT_ENTRY_SIZE - used
+
+    def _compact(self, page: bytearray) -> None:
+        # move all records to the end of the page, so the free space is contiguous
+        slot_count, _ = self._header(page)
+        records = [(slot, bytes(self._record(page, slot))) for slot in range(slot_count) if self._slot_entry(page, slot)[1] > 0]
+        directory_end = self.PAGE_HEADER_SIZE + slot_count * self.SLOT_ENTRY_SIZE
+        page[directory_end:] = bytes(self.page_size - directory_end)
+        record_area_start = self.page_size
+        for slot, entry in records:
+            record_area_start -= len(entry)
+            page[record_area_start:record_area_start + len(entry)] = entry
+            self._set_slot_entry(page, slot, record_area_start, len(entry))
+        self._set_header(page, slot_count, record_area_start)
+
+    def insert(self, page: bytearray, entry: bytes) -> Optional[int]:
+        """
+        Write an encoded record to the page, reusing the first empty slot if there is one.
+        :return: The slot of the record, or None if the page does not have enough free space.
+        """
+        slot_count, record_area_start = self._header(page)
+        slot = next((slot for slot in range(slot_count) if self._slot_entry(page, slot)[1] == 0), slot_count)
+        needed = len(entry) + (self.SLOT_ENTRY_SIZE if slot == slot_count else 0)
+
+        directory_end = self.PAGE_HEADER_SIZE + slot_count * self.SLOT_ENTRY_SIZE
+        if record_area_start - directory_end < needed:
+            if self._free_space(page) < needed:
+                return None
+            self._compact(page)
+            slot_count, record_area_start = self._header(page)
+
+        record_area_start -= len(entry)
+        page[record_area_start:record_area_start + len(entry)] = entry
+        self._set_slot_entry(page, slot, record_area_start, len(entry))
+        self._set_header(page, max(slot_count, slot + 1), record_area_start)
+        return slot
+
+    def delete(self, page: bytearray, slot: int) -> None:
+        slot_count, record_area_start = self._header(page)
+        offset, length = self._slot_entry(page, slot)
+        page[offset:offset + length] = bytes(length)
+        self._set_slot_entry(page, slot, 0, 0)
+        # drop empty entries from the end of the directory, other slots keep their numbers
+        while slot_count > 0 and self._slot_entry(page, slot_count - 1)[1] == 0:
+            slot_count -= 1
+        self._set_header(page, slot_count, record_area_start if slot_count > 0 else self.page_size)
+
+    def has_room(self, page: bytes) -> bool:
+        # room for a record of the maximum size, so any record can be inserted into a page the free space map returns
+        return self._free_space(page) >= self.max_record_size + self.SLOT_ENTRY_SIZE
+
+    def is_empty(self, page: bytes) -> bool:
+        return self._header(page)[0] == 0
+
+
+def make_page_format(name: str, codec: RecordCodec, page_size: int, page_slots: int, page_header_size: int):
+    """
+    Create the page format object of a table.
+    :param name: Name of the page format, one of PAGE_FORMATS.
+    :param codec: Codec of the records of the table.
+    :param page_size: Size of a page in bytes.
+    :param page_slots: Number of slots in a page, only used by the fixed format.
+    :param page_header_size: Size of the page header in bytes, only used by the fixed format.
+    :return: The page format object.
+    """
+    if name == "fixed":
+        return FixedPageFormat(codec, page_size, page_slots, page_header_size)
+    elif name == "slotted":
+        return SlottedPageFormat(codec, page_size)
+    raise ValueError(f"Unsupported page format '{name}', expected one of {', '.join(PAGE_FORMATS)}.")
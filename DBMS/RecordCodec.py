@@ -0,0 +1,197 @@
+import struct
+from typing import Dict, Iterator, Tuple
+
+INT_SIZE = 4 # bytes, signed
+STR_SIZE = 256 # bytes, assuming max length of string is 256 characters
+INT_MIN, INT_MAX = -2 ** 31, 2 ** 31 - 1
+STR_LENGTH_SIZE = 2 # bytes, length prefix of str fields in the variable length format
+
+
+class RecordCodec:
+    def __init__(self, fields: Dict[str, str], pk_idx: int):
+        """
+        Initialize a codec converting the records of a schema to and from their fixed length binary format.
+        The format is compiled once into a struct.Struct, and the offset of each field in an encoded record is
+        precomputed, so a single field can be compared without decoding the whole record.
+
+        Record Structure: [ field 0 | field 1 | ... ], int fields are 4 byte big endian signed integers and str fields
+        are UTF-8 strings padded with null bytes to 256 bytes.
+        Variable Length Record Structure: same as above, except str fields are stored as a 2 byte length followed by the
+        UTF-8 bytes of the string, without padding.
+
+        :param fields: Field names mapped to field types, in the order they are stored.
+        :param pk_idx: Index of the primary key field.
+        """
+        self.field_names = list(fields.keys())
+        self.field_types = list(fields.values())
+        self.pk_idx = pk_idx
+
+        struct_format = '>'
+        self.offsets = []
+        offset = 0
+        for field_type in self.field_types:
+            self.offsets.append(offset)
+            if field_type == "int":
+                struct_format += 'i'
+                offset += INT_SIZE
+            elif field_type == "str":
+                struct_format += f'{STR_SIZE}s'
+                offset += STR_SIZE
+            else:
+                raise ValueError(f"Unsupported field type '{field_type}'.")
+        self.struct = struct.Struct(struct_format)
+        self.size = self.struct.size
+
+        self.str_positions = [i for i, field_type in enumerate(self.field_types) if field_type == "str"]
+        self.max_variable_size = sum(INT_SIZE if field_type == "int" else STR_LENGTH_SIZE + STR_SIZE
+                                     for field_type in self.field_types)
+        self.min_variable_size = sum(INT_SIZE if field_type == "int" else STR_LENGTH_SIZE for field_type in self.field_types)
+        self.field_sizes = [INT_SIZE if field_type == "int" else STR_SIZE for field_type in self.field_types]
+        self.pk_offset = self.offsets[pk_idx]
+        self.pk_size = self.field_sizes[pk_idx]
+
+    def __reduce__(self):
+        # compiled structs cannot be pickled, so codecs are sent to worker processes as their schema and recompiled
+        return RecordCodec, (dict(zip(self.field_names, self.field_types)), self.pk_idx)
+
+    @staticmethod
+    def _convert(field_type: str, field_value: str|int) -> int|bytes:
+        # convert a field value to what the struct packs for the field, validating its range
+        if field_type == "int":
+            field_value = int(field_value)
+            if not INT_MIN <= field_value <= INT_MAX:
+                raise OverflowError(f"Integer value {field_value} does not fit in {INT_SIZE} bytes.")
+            return field_value
+        field_value = str(field_value).encode('utf-8')
+        if len(field_value) > STR_SIZE:
+            raise ValueError(f"String value '{field_value}' exceeds maximum length of {STR_SIZE} characters.")
+        return field_value
+
+    def encode(self, field_values: Tuple[str|int]) -> bytes:
+        """
+        Encode a record from a tuple of field values to bytes.
+        :param field_values: A tuple containing the field values to be encoded.
+        :return: Bytes representation of the record.
+        """
+        if len(field_values) != len(self.field_types):
+            raise ValueError(f"Expected {len(self.field_types)} field values, but got {len(field_values)}.")
+        return self.struct.pack(*[self._convert(field_type, field_value)
+                                  for field_type, field_value in zip(self.field_types, field_values)])
+
+    def encode_key(self, pk_value: str|int) -> bytes:
+        """
+        Encode a primary key value the same way it is stored in a record.
+        :param pk_value: The primary key value.
+        :return: Bytes representation of the primary key field.
+        """
+        return self.encode_field(self.pk_idx, pk_value)
+
+    def encode_field(self, field_idx: int, field_value: str|int) -> bytes:
+        """
+        Encode the value of a field the same way it is stored in a record of the fixed length format.
+        :param field_idx: Index of the field.
+        :param field_value: The value.
+        :return: Bytes representation of the field.
+        """
+        field_value = self._convert(self.field_types[field_idx], field_value)
+        if isinstance(field_value, int):
+            return field_value.to_bytes(INT_SIZE, 'big', signed=True)
+        return field_value.ljust(STR_SIZE, b'\x00')
+
+    def key_at(self, buffer: bytes, record_offset: int) -> bytes:
+        """
+        :return: The encoded primary key of the record starting at the given offset of the buffer, without decoding it.
+        """
+        key_offset = record_offset + self.pk_offset
+        return buffer[key_offset:key_offset + self.pk_size]
+
+    def field_at(self, buffer: bytes, record_offset: int, field_idx: int) -> bytes:
+        """
+        :return: The encoded value of a field of the record starting at the given offset of the buffer, without decoding it.
+        """
+        field_offset = record_offset + self.offsets[field_idx]
+        return buffer[field_offset:field_offset + self.field_sizes[field_idx]]
+
+    def _to_record(self, values: tuple) -> Dict[str, str|int]:
+        values = list(values)
+        for i in self.str_positions:
+            values[i] = values[i].decode('utf-8').rstrip('\x00')
+        return dict(zip(self.field_names, values))
+
+    def decode(self, entry: bytes) -> Dict[str, str|int]:
+        """
+        Decode a record from bytes to a dictionary.
+        :param entry: The bytes representation of the record.
+        :return: A dictionary with field names as keys and field values as values.
+        """
+        return self._to_record(self.struct.unpack(entry))
+
+    def decode_many(self, buffer: bytes, slot_mask: int) -> Iterator[Tuple[int, Dict[str, str|int]]]:
+        """
+        Decode the occupied ones of consecutive records, such as the slots of a page, with a single iter_unpack.
+        :param buffer: Consecutive encoded records, its length must be a multiple of the record size.
+        :param slot_mask: Bitmap of the records to decode, bit i is set if record i is occupied.
+        :return: A generator of (record index, record) tuples.
+        """
+        for i, values in enumerate(self.struct.iter_unpack(buffer)):
+            if slot_mask & (1 << i):
+                yield i, self._to_record(values)
+
+    def encode_variable(self, field_values: Tuple[str|int]) -> bytes:
+        """
+        Encode a record from a tuple of field values to the variable length format.
+        :param field_values: A tuple containing the field values to be encoded.
+        :return: Bytes representation of the record.
+        """
+        if len(field_values) != len(self.field_types):
+            raise ValueError(f"Expected {len(self.field_types)} field values, but got {len(field_values)}.")
+        entry = bytearray()
+        for field_type, field_value in zip(self.field_types, field_values):
+            field_value = self._convert(field_type, field_value)
+            if field_type == "int":
+                entry.extend(field_value.to_bytes(INT_SIZE, 'big', signed=True))
+            else:
+                entry.extend(len(field_value).to_bytes(STR_LENGTH_SIZE, 'big'))
+                entry.extend(field_value)
+        return bytes(entry)
+
+    def decode_variable(self, entry: bytes) -> Dict[str, str|int]:
+        """
+        Decode a record in the variable length format from bytes to a dictionary.
+        :param entry: The bytes representation of the record.
+        :return: A dictionary with field names as keys and field values as values.
+        """
+        record = {}
+        offset = 0
+        for field_name, field_type in zip(self.field_names, self.field_types):
+            if field_type == "int":
+                record[field_name] = int.from_bytes(entry[offset:offset + INT_SIZE], 'big', signed=True)
+                offset += INT_SIZE
+            else:
+                length = int.from_bytes(entry[offset:offset + STR_LENGTH_SIZE], 'big')
+                offset += STR_LENGTH_SIZE
+                record[field_name] = bytes(entry[offset:offset + length]).decode('utf-8')
+                offset += length
+        return record
+
+    def variable_key(self, entry: bytes) -> bytes:
+        """
+        :return: The primary key of a record in the variable length format, encoded the same way as by encode_key().
+        """
+        return self.variable_field(entry, self.pk_idx)
+
+    def variable_field(self, entry: bytes, field_idx: int) -> bytes:
+        """
+        :return: The value of a field of a record in the variable length format, encoded the same way as by encode_field().
+        """
+        offset = 0
+        for field_type in self.field_types[:field_idx]:
+            if field_type == "int":
+                offset += INT_SIZE
+            else:
+                offset += STR_LENGTH_SIZE + int.from_bytes(entry[offset:offset + STR_LENGTH_SIZE], 'big')
+        if self.field_types[field_idx] == "int":
+            return bytes(entry[offset:offset + INT_SIZE])
+        length = int.from_bytes(entry[offset:offset + STR_LENGTH_SIZE], 'big')
+        offset += STR_LENGTH_SIZE
+        return bytes(entry[offset:offset + length]).ljust(STR_SIZE, b'\x00')
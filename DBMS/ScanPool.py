@@ -0,0 +1,83 @@
+import atexit
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterator, List, Optional, Tuple
+
+
+class ScanPool:
+    def __init__(self, workers: Optional[int] = None, min_scan_size: int = 4 * 1024 * 1024):
+        """
+        Initialize a pool of worker processes running full table scans in parallel.
+        A scan is split into tasks of one file, or of a range of pages when there are fewer files than workers, and
+        the results of the tasks are returned in order. Scans of less than min_scan_size bytes, and all scans when there
+        is a single worker, run serially in the calling process instead, where starting the tasks would cost more than
+        it saves. Processes are started on first use, and kept until the pool is closed.
+        :param workers: Number of worker processes, defaults to the number of CPUs.
+        :param min_scan_size: Total size of the scanned files in bytes from which a scan runs in parallel.
+        """
+        self.workers = workers if workers is not None else (os.cpu_count() or 1)
+        self.min_scan_size = min_scan_size
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.executor_lock = threading.Lock() # scans of commands running in parallel threads share the processes
+
+    def set_workers(self, workers: int) -> None:
+        """
+        Change the number of worker processes, 1 runs every scan serially.
+        :param workers: Number of worker processes.
+        """
+        if workers < 1:
+            raise ValueError("Number of scan workers must be at least 1.")
+        if workers != self.workers:
+            self.close() # started again with the new number of processes on the next parallel scan
+        self.workers = workers
+
+    def is_parallel(self, scan_size: int) -> bool:
+        """
+        :param scan_size: Total size of the files to scan in bytes.
+        :return: True if a scan of this size should run in the worker processes.
+        """
+        return self.workers > 1 and scan_size >= self.min_scan_size
+
+    def page_ranges(self, file_count: int, pages_per_file: int) -> List[Tuple[int, int]]:
+        """
+        :return: (first page, end page) of the tasks each file is split into, so there is a task for each worker.
+        """
+        range_count = min(pages_per_file, max(1, -(-self.workers // file_count)))
+        range_size = -(-pages_per_file // range_count)
+        return [(first_page, min(first_page + range_size, pages_per_file))
+                for first_page in range(0, pages_per_file, range_size)]
+
+    def map(self, function: Callable, arguments: List[tuple]) -> Iterator:
+        """
+        Run a function in the worker processes for each argument tuple.
+        The tasks that have not started yet are cancelled when the caller stops iterating over the results, for
+        example once a searched key is found.
+        :param function: A picklable function, such as a method of a picklable object.
+        :param arguments: Argument tuples of the tasks.
+        :return: A generator of the results of the tasks, in the order of the arguments.
+        """
+        with self.executor_lock:
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        futures = [self.executor.submit(function, *task_arguments) for task_arguments in arguments]
+        try:
+            for future in futures:
+                yield future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def close(self) -> None:
+        """
+        Stop the worker processes, cancelling the tasks that have not started yet.
+        """
+        with self.executor_lock:
+            if self.executor is not None:
+                self.executor.shutdown(wait=True, cancel_futures=True)
+                self.executor = None
+
+
+# scan pool shared by all tables
+scan_pool = ScanPool()
+atexit.register(scan_pool.close)
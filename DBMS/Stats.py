@@ -0,0 +1,121 @@
+import json
+from typing import Dict, List, Optional
+
+# counters of the work done by commands, in the order they are reported
+COUNTERS = (
+    "page_requests", # pages requested from the buffer pool, cached or not
+    "pages_read", # pages the buffer pool read from disk
+    "bytes_read",
+    "pages_written", # pages the buffer pool wrote back to disk
+    "bytes_written",
+    "file_opens", # file handles opened by the buffer pool
+    "wal_bytes_written",
+    "wal_syncs",
+    "checkpoints",
+    "slots_read", # stored primary keys compared to a searched key
+    "records_decoded",
+    "index_lookups", # primary key index probes
+    "bloom_skips", # files ruled out by their bloom filter
+    "full_scans",
+    "scanned_bytes", # size of the files read by full table scans
+    "catalog_reads", # catalog entries looked up
+    "catalog_writes", # catalog entries saved or deleted
+    "catalog_flushes", # writes of the catalog file
+)
+
+
+class Stats:
+    def __init__(self):
+        """
+        Initialize counters of the work done by commands, and the number and duration of each type of command.
+        Collection is disabled by default. Code that counts checks `enabled` first, so disabled stats cost a single
+        attribute lookup. Counters are not locked, so they may miss a few increments while commands run in parallel
+        threads, see server.py.
+        """
+        self.enabled = False
+        self.dump_path: Optional[str] = None # file the stats are written to as JSON at the end of the session
+        self.counters: Dict[str, int] = {}
+        self.commands: Dict[str, List[float]] = {} # command type -> [count, total seconds, max seconds]
+        self.reset()
+
+    def enable(self, dump_path: Optional[str] = None) -> None:
+        """
+        Start collecting stats.
+        :param dump_path: If given, the stats are written to this file as JSON by dump() at the end of the session.
+        """
+        self.enabled = True
+        self.dump_path = dump_path
+
+    def reset(self) -> None:
+        """
+        Set all counters back to zero.
+        """
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.commands = {}
+
+    def add(self, counter: str, amount: int = 1) -> None:
+        """
+        Increase a counter, callers check `enabled` first.
+        :param counter: Name of the counter, one of COUNTERS.
+        :param amount: Amount to add.
+        """
+        self.counters[counter] += amount
+
+    def record_command(self, command_type: str, seconds: float, count: int = 1) -> None:
+        """
+        Record the duration of commands of a type.
+        :param command_type: The first two words of the commands, e.g. "search record".
+        :param seconds: Total duration of the commands.
+        :param count: Number of commands run together, e.g. by a batch of inserts. Each is counted with the mean duration.
+        """
+        timing = self.commands.setdefault(command_type, [0, 0.0, 0.0])
+        timing[0] += count
+        timing[1] += seconds
+        timing[2] = max(timing[2], seconds / count)
+
+    def snapshot(self) -> dict:
+        """
+        :return: The counters, and the count, total, mean and max duration of each type of command.
+        """
+        return {
+            "counters": dict(self.counters),
+            "commands": {command_type: {"count": count, "total_seconds": round(total, 6),
+                                        "mean_us": round(total / count * 1e6, 1), "max_us": round(maximum * 1e6, 1)}
+                         for command_type, (count, total, maximum) in self.commands.items()},
+        }
+
+    def merge(self, snapshot: dict) -> None:
+        """
+        Add the stats of another process, e.g. a worker of archive.main_parallel().
+        :param snapshot: Stats returned by snapshot().
+        """
+        for counter, value in snapshot["counters"].items():
+            self.counters[counter] = self.counters.get(counter, 0) + value
+        for command_type, timing in snapshot["commands"].items():
+            own = self.commands.setdefault(command_type, [0, 0.0, 0.0])
+            own[0] += timing["count"]
+            own[1] += timing["total_seconds"]
+            own[2] = max(own[2], timing["max_us"] / 1e6)
+
+    def report(self) -> List[str]:
+        """
+        :return: Lines of text describing the stats, as output by the `stats` command.
+        """
+        snapshot = self.snapshot()
+        lines = [f"{counter} {value}" for counter, value in snapshot["counters"].items()]
+        for command_type, timing in snapshot["commands"].items():
+            lines.append(f"{command_type} count {timing['count']} mean_us {timing['mean_us']} max_us {timing['max_us']}")
+        return lines
+
+    def dump(self) -> None:
+        """
+        Write the stats to the dump file as JSON, if one was given to enable().
+        """
+        if self.dump_path is None:
+            return
+        with open(self.dump_path, 'w') as f:
+            json.dump(self.snapshot(), f, indent=4)
+
+
+# stats shared by all commands of the session
+stats = Stats()
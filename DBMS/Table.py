@@ -1,24 +1,50 @@
+import copy
+import csv
 import os
-from typing import List, Tuple, Dict, Optional
-from DBMS.utils import load_catalog_entry, save_catalog_entry
-from DBMS.utils import DISK_PATH
+import zlib
+from itertools import islice
+from typing import Callable, Iterator, List, Tuple, Dict, Optional
+from DBMS.utils import DISK_PATH, sync_directory
+from DBMS.Catalog import Catalog, catalog as shared_catalog
 from DBMS.exceptions import KeyConstraintViolation
+from DBMS.Index import HashIndex, SortedIndex, RecordId
+from DBMS.FreeSpaceMap import FreeSpaceMap
+from DBMS.BloomFilter import BloomFilter
+from DBMS.BufferPool import buffer_pool, FILE_HEADER_PAGE
+from DBMS.RecordCodec import RecordCodec, INT_MIN, INT_MAX
+from DBMS.PageFormat import make_page_format, PAGE_FORMATS
+from DBMS.FileScanner import FileScanner, field_matcher
+from DBMS.ScanPool import scan_pool
+from DBMS.Stats import stats
 
 class Table:
-    def __init__(self, table_name, new_table_args=None):
+    def __init__(self, table_name, new_table_args=None, catalog: Catalog = None):
         """
         Initialize a Table object.
         Tables might be stored in multiple files, each file containing at most PAGES_PER_FILE pages.
         The file naming convention for multiple files of a table is: `<table_name>_1.bat`, `<table_name>_2.bat`, etc.
         :param table_name: Name of the table to be created or loaded.
-        :param new_table_args: Arguments required for creating a new table.
+        :param new_table_args: Arguments required for creating a new table: field count, primary key index, fields and
+                               optionally a dictionary of storage options (`format`: `fixed` or `slotted`, `slots`:
+                               slots per page, `pages`: pages per file, `align`: page alignment in bytes,
+                               `partitions`: number of hash partitions of the primary key).
+        :param catalog: Catalog the table is registered in, defaults to the catalog shared by the session.
         """
 
         # constants
-        self.PAGE_SLOTS = 8
-        self.PAGES_PER_FILE = 256
+        self.DEFAULT_PAGE_SLOTS = 8
+        self.DEFAULT_PAGES_PER_FILE = 256
+        self.MAX_PAGE_SLOTS = 65535 # slots are stored in 2 bytes by the primary key index
+        self.BLOOM_BITS_PER_KEY = 10 # about 1% false positives for a full file
+        self.BLOOM_HASH_COUNT = 7
+        self.BLOOM_PRECHECK_FILES = 4 # most files a key can be stored in for the uniqueness check to consult the filters first
+        self.PAGE_ALIGNMENTS = (4096, 8192) # supported page alignments, matching OS pages and disk blocks
+        self.MAX_PARTITIONS = 256
+        self.SECONDARY_INDEX_TYPES = ("hash", "sorted") # hash indexes answer equality queries, sorted ones ranges of int fields
         self.MAX_TABLE_NAME_LENGTH_ALLOWED = 12
         self.MAX_FIELD_NAME_LENGTH_ALLOWED = 20
+        self.CSV_BUFFER_SIZE = 1024 * 1024 # bytes read from or written to CSV files at once
+        self.IMPORT_BLOCK_ROWS = 10000 # rows of a CSV file inserted together, see import_csv()
 
         if len(table_name) > self.MAX_TABLE_NAME_LENGTH_ALLOWED:
             raise ValueError(f"Table name '{table_name}' exceeds maximum length of {self.MAX_TABLE_NAME_LENGTH_ALLOWED} characters.")
@@ -26,13 +52,10 @@ class Table:
         if not table_name.isalnum() or table_name.isnumeric():
             raise ValueError(f"Table name '{table_name}' must be alphanumeric and not purely numeric.")
 
-        # Page Structure: [ bitmap | record 0 | record 1 | ... | record 7 ]
-        self.PAGE_HEADER_SIZE = 1 # 1 byte for bitmap of 8 bits
-        self.FILE_HEADER_SIZE = 32 # 32 bytes for page bitmap of 256 bits
-
         # check if the table entry exists in the catalog
         self.table_name = table_name
-        self.catalog_entry = load_catalog_entry(table_name)
+        self.catalog = catalog if catalog is not None else shared_catalog
+        self.catalog_entry = self.catalog.get_entry(table_name)
 
         # create the table and catalog entry if it does not exist
         if self.catalog_entry is None:
@@ -40,7 +63,10 @@ class Table:
                 raise ValueError(f"Table '{table_name}' does not exist and no arguments provided to create it.")
             else:
                 self._create_table(new_table_args)
-                self.catalog_entry = load_catalog_entry(table_name)
+                self.catalog_entry = self.catalog.get_entry(table_name)
+
+        # a conversion or vacuum interrupted by a crash is undone, or finished if only the old files were left behind
+        rebuilt_indexes = self._recover_rewrite() if "rewrite" in self.catalog_entry else {}
 
         self.field_count = self.catalog_entry["field_count"]
         self.pk_idx = self.catalog_entry["pk_idx"]
@@ -49,13 +75,90 @@ class Table:
         self.page_size = self.catalog_entry["page_size"]
         self.file_count = self.catalog_entry["file_count"]
 
-        # files this table is stored in, (always named <table_name>_<file_index>.bat), sorted by file index
-        self.files = [f for f in os.listdir(DISK_PATH) if f.startswith(self.table_name) and f.endswith('.bat')]
-        self.files.sort(key=lambda x: int(x.split('_')[-1].split('.')[0]))
-        self.files = [os.path.join(DISK_PATH, f) for f in self.files]  # convert to full paths
+        # page geometry, types created before it was configurable have 8 slots per page and 256 pages per file
+        # Page Structure of the fixed format: [ bitmap | record 0 | record 1 | ... ], see DBMS/PageFormat.py
+        # File Structure: [ page bitmap | page 0 | page 1 | ... ], the bitmap is padded to the page alignment if any
+        self.PAGE_SLOTS = self.catalog_entry.get("page_slots", self.DEFAULT_PAGE_SLOTS)
+        self.PAGES_PER_FILE = self.catalog_entry.get("pages_per_file", self.DEFAULT_PAGES_PER_FILE)
+        self.PAGE_HEADER_SIZE = self.catalog_entry.get("page_header_size", 1) # 1 byte for bitmap of 8 bits
+        self.FILE_HEADER_SIZE = self.catalog_entry.get("file_header_size", 32) # 32 bytes for page bitmap of 256 bits
 
-    def _create_table(self, args: Tuple[int, int, Dict[str, str]]):
-        field_count, pk_idx, fields = args
+        # record format compiled once for the schema, with the position and size of the primary key field
+        self.codec = RecordCodec(self.fields, self.pk_idx)
+        self.pk_offset = self.codec.pk_offset
+        self.pk_size = self.codec.pk_size
+        self._load_page_format()
+
+        # files this table is stored in, (always named <table_name>_<file_index>.bat), sorted by file index
+        self.files = [self._file_path(file_index) for file_index in range(1, self.file_count + 1)]
+
+        # file indexes of each hash partition, a record is only ever stored in the files of the partition its primary
+        # key hashes to, see _partition(). None if the table is not partitioned, then any file can store any record
+        self.partitions: Optional[List[List[int]]] = self.catalog_entry.get("partitions")
+
+        # primary key index, free space map and bloom filters, tables created before they were introduced get them built from their heap files
+        missing_structures = [key for key in ("pk_index", "free_space_map", "bloom_filter") if key not in self.catalog_entry]
+        if "pk_index" in missing_structures:
+            self.catalog_entry["pk_index"] = {"type": "hash", "file": f"{self.table_name}_pk.idx"}
+        if "free_space_map" in missing_structures:
+            self.catalog_entry["free_space_map"] = {"file": f"{self.table_name}.fsm"}
+        if "bloom_filter" in missing_structures:
+            self.catalog_entry["bloom_filter"] = self._bloom_filter_entry(self.page_format, self.PAGES_PER_FILE)
+        self.pk_index = HashIndex(os.path.join(DISK_PATH, self.catalog_entry["pk_index"]["file"]))
+        self.free_space_map = FreeSpaceMap(os.path.join(DISK_PATH, self.catalog_entry["free_space_map"]["file"]), self.PAGES_PER_FILE, len(self.files))
+        bloom_filter_entry = self.catalog_entry["bloom_filter"]
+        self.bloom_filter = BloomFilter(os.path.join(DISK_PATH, bloom_filter_entry["file"]), bloom_filter_entry["bits"],
+                                        bloom_filter_entry["hashes"], len(self.files))
+        if "pk_index" in missing_structures:
+            self.rebuild_index()
+        if "free_space_map" in missing_structures:
+            self.rebuild_free_space_map()
+        if "bloom_filter" in missing_structures:
+            self.rebuild_bloom_filter()
+        if missing_structures:
+            self.catalog.save_entry(self.table_name, self.catalog_entry)
+
+        # secondary indexes by field name, see create_index()
+        self.field_indices = {field_name: field_idx for field_idx, field_name in enumerate(self.fields)}
+        self.secondary_indexes: Dict[str, HashIndex | SortedIndex] = {}
+        for field_name, index_entry in self.catalog_entry.get("secondary_indexes", {}).items():
+            self.secondary_indexes[field_name] = self._open_secondary_index(index_entry)
+        for field_name, index_entry in rebuilt_indexes.items():
+            self.create_index(field_name, index_entry["type"])
+
+    def _load_page_format(self) -> None:
+        # types created before the slotted format was introduced use the fixed format
+        self.page_format = make_page_format(self.catalog_entry.get("page_format", "fixed"), self.codec,
+                                            self.page_size, self.PAGE_SLOTS, self.PAGE_HEADER_SIZE)
+        self.scanner = FileScanner(self.page_format, self.FILE_HEADER_SIZE, self.PAGES_PER_FILE)
+
+    def _bloom_filter_entry(self, page_format, pages_per_file: int) -> dict:
+        # filters are sized for a file full of records of the smallest possible size
+        bit_count = max(64, pages_per_file * page_format.max_records * self.BLOOM_BITS_PER_KEY)
+        return {"file": f"{self.table_name}.bloom", "bits": bit_count, "hashes": self.BLOOM_HASH_COUNT}
+
+    def _create_table(self, args: Tuple[int, int, Dict[str, str], Dict[str, str]]):
+        field_count, pk_idx, fields = args[:3]
+        options = args[3] if len(args) > 3 else {}
+
+        for option in options:
+            if option not in ("format", "slots", "pages", "align", "partitions"):
+                raise ValueError(f"Unsupported table option '{option}'.")
+        page_format = options.get("format", "fixed")
+        if page_format not in PAGE_FORMATS:
+            raise ValueError(f"Unsupported page format '{page_format}', expected one of {', '.join(PAGE_FORMATS)}.")
+        page_slots = int(options.get("slots", self.DEFAULT_PAGE_SLOTS))
+        if not (1 <= page_slots <= self.MAX_PAGE_SLOTS):
+            raise ValueError(f"Slots per page must be between 1 and {self.MAX_PAGE_SLOTS}.")
+        pages_per_file = int(options.get("pages", self.DEFAULT_PAGES_PER_FILE))
+        if pages_per_file < 1:
+            raise ValueError("Pages per file must be at least 1.")
+        alignment = int(options.get("align", 0))
+        if alignment and alignment not in self.PAGE_ALIGNMENTS:
+            raise ValueError(f"Unsupported page alignment {alignment}, expected one of {', '.join(map(str, self.PAGE_ALIGNMENTS))}.")
+        partition_count = int(options.get("partitions", 1))
+        if not (1 <= partition_count <= self.MAX_PARTITIONS):
+            raise ValueError(f"Number of partitions must be between 1 and {self.MAX_PARTITIONS}.")
 
         if field_count <= 0:
             raise ValueError("Table must have at least one field.")
@@ -77,21 +180,53 @@ class Table:
                 entry_size += 256 # bytes, assuming max length of string is 256 characters
             else:
                 raise ValueError(f"Unsupported field type '{field_type}'.")
-        page_size = entry_size * self.PAGE_SLOTS + self.PAGE_HEADER_SIZE
+
+        # the bitmaps have a bit for each slot of a page and for each page of a file
+        page_header_size = (page_slots + 7) // 8
+        file_header_size = (pages_per_file + 7) // 8
+        page_size = entry_size * page_slots + page_header_size
+        if alignment:
+            # round pages up to whole aligned blocks, so reading a page reads whole blocks and never straddles one
+            page_size = -(-page_size // alignment) * alignment
+            file_header_size = -(-file_header_size // alignment) * alignment
+            if "slots" not in options:
+                # fill the padding with as many slots as fit in the aligned page
+                page_slots = page_size * 8 // (entry_size * 8 + 1)
+                while (page_slots + 7) // 8 + entry_size * page_slots > page_size:
+                    page_slots -= 1
+                page_slots = min(page_slots, self.MAX_PAGE_SLOTS)
+                page_header_size = (page_slots + 7) // 8
+        # slotted pages have the same size, but fit more records when strings are shorter than their maximum length
+        new_page_format = make_page_format(page_format, RecordCodec(fields, pk_idx), page_size, page_slots, page_header_size) # validates the page size
 
         catalog_key = self.table_name
         catalog_entry = {
-            "file_count": 1,  # Initially one file, file names are always <table_name>_<file_index>.bat
+            "file_count": partition_count,  # Initially one file per partition, file names are always <table_name>_<file_index>.bat
             "field_count": field_count,
             "pk_idx": pk_idx,
             "fields": fields,
             "entry_size": entry_size,
             "page_size": page_size,
+            "page_format": page_format,
+            "page_slots": page_slots,
+            "pages_per_file": pages_per_file,
+            "page_header_size": page_header_size,
+            "file_header_size": file_header_size,
+            "pk_index": {"type": "hash", "file": f"{self.table_name}_pk.idx"},
+            "free_space_map": {"file": f"{self.table_name}.fsm"},
+            "bloom_filter": self._bloom_filter_entry(new_page_format, pages_per_file),
         }
-        save_catalog_entry(catalog_key, catalog_entry)
+        if partition_count > 1:
+            catalog_entry["partitions"] = [[file_index] for file_index in range(1, partition_count + 1)]
+        self.catalog.save_entry(catalog_key, catalog_entry)
 
-        file_path = os.path.join(DISK_PATH, f"{self.table_name}_1.bat")
-        open(file_path, 'wb')
+        for file_index in range(1, partition_count + 1):
+            open(self._file_path(file_index), 'wb')
+        HashIndex(os.path.join(DISK_PATH, catalog_entry["pk_index"]["file"])).clear()
+        FreeSpaceMap(os.path.join(DISK_PATH, catalog_entry["free_space_map"]["file"]), pages_per_file, 0).reset(partition_count)
+        bloom_filter_entry = catalog_entry["bloom_filter"]
+        BloomFilter(os.path.join(DISK_PATH, bloom_filter_entry["file"]), bloom_filter_entry["bits"],
+                    bloom_filter_entry["hashes"], 0).reset(partition_count)
 
 
     def add_record(self, field_values: Tuple[str|int]) -> None:
@@ -110,69 +245,159 @@ class Table:
         if record_with_same_pk is not None:
             raise KeyConstraintViolation(f"Primary key constraint violated: {pk_value} already exists in the table.")
 
-        # add the record to first available page of first available file
-        file_path, page_number = self.search_unfilled_page()
-        with open(file_path, 'r+b') as f:
-            # seek to the unfilled page
-            f.seek(self.FILE_HEADER_SIZE + page_number * self.page_size)
+        # encode the record before touching the page, so an invalid value does not leave the page modified
+        entry_encoded = self.encode_record(field_values)
+        self._place_records([(entry_encoded, self.encode_key(pk_value))])
 
-            page_header = f.read(self.PAGE_HEADER_SIZE)
-            page_bitmap = int.from_bytes(page_header, 'big')
-
-            # find the first available slot in the page
-            slot_idx = 0
-            while page_bitmap & (1 << slot_idx) and slot_idx < self.PAGE_SLOTS:
-                slot_idx += 1
-            if slot_idx >= self.PAGE_SLOTS: # sanity check
+    def bulk_insert(self, rows: List[Tuple[str|int]]) -> List[bool]:
+        """
+        Add many records to the table at once.
+        The outcome is the same as calling add_record() for each row in order, but the primary keys of the whole batch
+        are checked together and the records are written page by page, updating the page and file headers once per page.
+        :param rows: Field values of the records to be added.
+        :return: For each row, True if it was added, False if it was rejected (wrong number of fields, invalid value or
+                 primary key constraint violation).
+        """
+        results = []
+        accepted = [] # (encoded record, encoded primary key) of the rows to be added
+        batch_keys = set()
+        for field_values in rows:
+            try:
+                if len(field_values) != self.field_count:
+                    raise ValueError(f"Expected {self.field_count} field values, but got {len(field_values)}.")
+                entry_encoded = self.encode_record(field_values)
+                encoded_key = self.encode_key(field_values[self.pk_idx])
+            except (ValueError, OverflowError):
+                results.append(False)
+                continue
+            if encoded_key in batch_keys:
+                results.append(False) # a previous row of the batch has the same primary key
+                continue
+            batch_keys.add(encoded_key)
+            accepted.append((entry_encoded, encoded_key))
+            results.append(True)
+
+        # reject rows whose primary key is already in the table
+        existing_keys = self._existing_keys(batch_keys)
+        if existing_keys:
+            accepted_iter = iter(accepted)
+            accepted = []
+            for i, result in enumerate(results):
+                if not result:
+                    continue
+                entry_encoded, encoded_key = next(accepted_iter)
+                if encoded_key in existing_keys:
+                    results[i] = False
+                else:
+                    accepted.append((entry_encoded, encoded_key))
+
+        self._place_records(accepted)
+        return results
+
+    def _existing_keys(self, encoded_keys) -> set:
+        # the subset of the given encoded primary keys that are stored in the table, compared without decoding records
+        # the bloom filters are consulted first only when the key can be stored in few files (small or partitioned
+        # tables): a filter check is cheaper than the index page it saves there, while with many files checking every
+        # filter costs more than the single index page a direct probe reads
+        existing = set()
+        for encoded_key in encoded_keys:
+            file_indices = self._key_files(encoded_key)
+            if len(file_indices) <= self.BLOOM_PRECHECK_FILES and \
+                    not self._files_may_contain(self.bloom_filter.positions(encoded_key), file_indices):
+                continue
+            if stats.enabled:
+                stats.add("index_lookups")
+            for file_index, page_number, slot in self.pk_index.lookup(encoded_key):
+                page = self._page(self._file_path(file_index), page_number)
+                if stats.enabled:
+                    stats.add("slots_read")
+                if self.page_format.is_occupied(page, slot) and self.page_format.key_at(page, slot) == encoded_key:
+                    existing.add(encoded_key)
+                    break
+        return existing
+
+    def _place_records(self, records: List[Tuple[bytes, bytes]]) -> None:
+        # write encoded records to the first available slots, filling one page at a time
+        # :param records: (encoded record, encoded primary key) of each record, their keys must not be in the table
+        if self.partitions is None:
+            self._fill_pages(records)
+            return
+
+        # each partition is filled separately, keeping the order of the records within a partition
+        partition_records = {}
+        for record in records:
+            partition_records.setdefault(self._partition(record[1]), []).append(record)
+        for partition, records_of_partition in partition_records.items():
+            self._fill_pages(records_of_partition, partition)
+
+    def _fill_pages(self, records: List[Tuple[bytes, bytes]], partition: int = None) -> None:
+        # write encoded records to the first available slots of the files of a partition, or of any file if None
+        position = 0
+        while position < len(records):
+            file_path, page_number = self.search_unfilled_page(partition)
+            file_index = self._file_index(file_path)
+            page = self._page(file_path, page_number)
+
+            # fill the available slots of the page in order
+            placed = []
+            while position < len(records) and self.page_format.has_room(page):
+                entry_encoded, encoded_key = records[position]
+                placed.append((entry_encoded, encoded_key, self.page_format.insert(page, entry_encoded)))
+                position += 1
+            if not placed: # sanity check
                 raise ValueError(f"No available slots in page {page_number} of file {file_path}, even though it is returned as an unfilled page from search_unfilled_page() function.")
-
-            page_bitmap |= (1 << slot_idx) # update the page bitmap to mark the slot as filled
-            f.seek(self.FILE_HEADER_SIZE
-                   + page_number * self.page_size
-                   + self.PAGE_HEADER_SIZE
-                   + slot_idx * self.entry_size)
-
-            # encode the record and write it to the slot
-            entry_encoded = self.encode_record(field_values)
-            assert len(entry_encoded) == self.entry_size, f"Encoded entry size {len(entry_encoded)} does not match expected entry size {self.entry_size}."
-            f.write(entry_encoded)
-
-            # write the updated page header
-            f.seek(self.FILE_HEADER_SIZE + page_number * self.page_size)
-            f.write(page_bitmap.to_bytes(self.PAGE_HEADER_SIZE, 'big'))
+            buffer_pool.mark_dirty(file_path, page_number)
 
             # update the file header to mark the page as nonempty
-            f.seek(0)
-            file_header = f.read(self.FILE_HEADER_SIZE)
+            file_header = self._file_header(file_path)
             file_bitmap = int.from_bytes(file_header, 'big')
             file_bitmap |= (1 << page_number)
-            f.seek(0)
-            f.write(file_bitmap.to_bytes(self.FILE_HEADER_SIZE, 'big'))
-
-        save_catalog_entry(self.table_name, self.catalog_entry) # overwrite the catalog entry
-
-
-    def search_unfilled_page(self) -> Tuple[str, int]:
+            file_header[:] = file_bitmap.to_bytes(self.FILE_HEADER_SIZE, 'big')
+            buffer_pool.mark_dirty(file_path, FILE_HEADER_PAGE)
+
+            if not self.page_format.has_room(page):
+                self.free_space_map.mark_full(file_index, page_number)
+            for entry_encoded, encoded_key, slot_idx in placed:
+                self.pk_index.insert(encoded_key, (file_index, page_number, slot_idx))
+                self.bloom_filter.add(file_index, self.bloom_filter.positions(encoded_key))
+                if self.secondary_indexes:
+                    self._add_to_secondary_indexes(self.decode(entry_encoded), (file_index, page_number, slot_idx))
+            buffer_pool.commit_if_full() # the records placed so far are fully indexed, a commit keeps the table consistent
+
+    def _partition(self, encoded_key: bytes) -> int:
+        # partition owning a primary key, the hash differs from the index buckets only by its modulus
+        return zlib.crc32(encoded_key) % len(self.partitions)
+
+    def _key_files(self, encoded_key: bytes) -> List[int]:
+        # indexes of the files a record with the given primary key can be stored in
+        if self.partitions is None:
+            return list(range(1, len(self.files) + 1))
+        return self.partitions[self._partition(encoded_key)]
+
+    def _file_index(self, file_path: str) -> int:
+        # file names are always <table_name>_<file_index>.bat
+        return int(os.path.basename(file_path).split('_')[-1].split('.')[0])
+
+    def _file_path(self, file_index: int) -> str:
+        return os.path.join(DISK_PATH, f"{self.table_name}_{file_index}.bat")
+
+    def _page(self, file_path: str, page_number: int) -> bytearray:
+        # page bytes, starting with the page header, cached in the shared buffer pool
+        return buffer_pool.get_page(file_path, page_number, self.page_size, self.FILE_HEADER_SIZE)
+
+    def _file_header(self, file_path: str) -> bytearray:
+        return buffer_pool.get_page(file_path, FILE_HEADER_PAGE, self.page_size, self.FILE_HEADER_SIZE)
+
+    def search_unfilled_page(self, partition: int = None) -> Tuple[str, int]:
         """
-        Search for the first unfilled page in the table.
+        Search for the first unfilled page in the table, using the free space map.
+        :param partition: If the table is partitioned, the partition whose files are searched.
         :return: A tuple containing the file path and page number of the first unfilled page.
         """
-        for file_path in self.files:
-            with open(file_path, 'rb') as f:
-                # read the file header
-                f.seek(0)
-                file_header = f.read(self.FILE_HEADER_SIZE)
-                file_bitmap = int.from_bytes(file_header, 'big')
-
-                for page_number in range(self.PAGES_PER_FILE):
-                    if not file_bitmap & (1 << page_number):
-                        return file_path, page_number
-
-                    f.seek(self.FILE_HEADER_SIZE + page_number * self.page_size)
-                    page_header = f.read(self.PAGE_HEADER_SIZE)
-                    page_bitmap = int.from_bytes(page_header, 'big')
-                    if page_bitmap != (1 << self.PAGE_SLOTS) - 1:
-                        return file_path, page_number
+        free_page = self.free_space_map.find_free_page(self.partitions[partition] if partition is not None else None)
+        if free_page is not None:
+            file_index, page_number = free_page
+            return self._file_path(file_index), page_number
 
         # if no unfilled page found, all entries in all pages are filled
         # create a new file and return the first page of that file
@@ -182,15 +407,35 @@ class Table:
         open(new_file_path, 'wb')
 
         self.files.append(new_file_path)
-        self.catalog_entry["file_count"] += 1
-        save_catalog_entry(self.table_name, self.catalog_entry) # overwrite the catalog entry
+        self.free_space_map.add_file()
+        self.bloom_filter.add_file()
+        if partition is not None:
+            self.partitions[partition].append(new_file_index) # the list is part of the catalog entry
+        self.file_count += 1
+        self.catalog_entry["file_count"] = self.file_count
+        self.catalog.save_entry(self.table_name, self.catalog_entry) # overwrite the catalog entry
         return new_file_path, 0
 
+    def rebuild_free_space_map(self) -> None:
+        """
+        Rebuild the free space map from the file and page headers of the heap files.
+        """
+        self.free_space_map.reset(len(self.files))
+        for file_path in self.files:
+            file_bitmap = int.from_bytes(self._file_header(file_path), 'big')
+            for page_number in range(self.PAGES_PER_FILE):
+                if not file_bitmap & (1 << page_number):
+                    continue
+
+                if not self.page_format.has_room(self._page(file_path, page_number)):
+                    self.free_space_map.mark_full(self._file_index(file_path), page_number)
+
 
-    def search_record(self, key: str | int) -> tuple[dict[str, str | int], str, int, int] | None:
+    def search_record(self, key: str | int, use_index: bool = True) -> tuple[dict[str, str | int], str, int, int] | None:
         """
         Search for a record in the table by the primary key.
         :param key: The primary key value to search for.
+        :param use_index: Whether to find the record through the primary key index or by a full table scan.
         :return: The record and location in memory if found, None otherwise.
         """
         pk = list(self.fields.keys())[self.pk_idx]
@@ -207,56 +452,355 @@ class Table:
             if not isinstance(key, str):
                 search_key = str(key)
 
-        for file_path in self.files:
-            with open(file_path, 'rb') as f:
-                # read the file header
-                f.seek(0)
-                file_header = f.read(self.FILE_HEADER_SIZE)
-                file_bitmap = int.from_bytes(file_header, 'big')
-
-                # iterate over pages in file
-                for page_number in range(self.PAGES_PER_FILE):
-                    if not file_bitmap & (1 << page_number):
-                        continue
-
-                    f.seek(self.FILE_HEADER_SIZE + page_number * self.page_size)
-                    page_header = f.read(self.PAGE_HEADER_SIZE)
-                    page_bitmap = int.from_bytes(page_header, 'big')
-
-                    # iterate over slots in page
-                    for slot in range(self.PAGE_SLOTS):
-                        if not page_bitmap & (1 << slot):
-                            continue
-                        f.seek(self.FILE_HEADER_SIZE + page_number * self.page_size + self.PAGE_HEADER_SIZE + slot * self.entry_size)
-                        entry_encoded = f.read(self.entry_size)
-                        entry = self.decode(entry_encoded)
-                        if entry[pk] == search_key:
-                            return entry, file_path, page_number, slot
+        try:
+            encoded_key = self.encode_key(search_key)
+        except (ValueError, OverflowError):
+            return None # the key cannot be stored in this table, so no record can have it
+
+        # only the files of the partition owning the key can store it, and of those, files whose bloom filter rules
+        # out the key are never read. If all of them do, neither is the index
+        file_indices = self._files_may_contain(self.bloom_filter.positions(encoded_key), self._key_files(encoded_key))
+        if not file_indices:
+            return None
+
+        # candidates from the index share the hash of the key, compare the actual key stored in each without decoding
+        if stats.enabled and use_index:
+            stats.add("index_lookups")
+        candidates = self.pk_index.lookup(encoded_key) if use_index else self.scan_for_key(encoded_key, file_indices)
+        for file_index, page_number, slot in candidates:
+            page = self._page(self._file_path(file_index), page_number)
+            if stats.enabled:
+                stats.add("slots_read")
+            if self.page_format.is_occupied(page, slot) and self.page_format.key_at(page, slot) == encoded_key:
+                if stats.enabled:
+                    stats.add("records_decoded")
+                return self.page_format.decode_at(page, slot), self._file_path(file_index), page_number, slot
         return None
 
+    def _files_may_contain(self, positions: List[int], file_indices: List[int]) -> List[int]:
+        # indexes of the given files whose bloom filter does not rule out the key with the given bit positions.
+        # searches only read the filters, so they can run in parallel: stale filters are rebuilt by delete_record()
+        matching_indices = []
+        for file_index in file_indices:
+            if self.bloom_filter.may_contain(file_index, positions):
+                matching_indices.append(file_index)
+            elif stats.enabled:
+                stats.add("bloom_skips")
+        return matching_indices
+
+    def scan_for_key(self, encoded_key: bytes, file_indices: List[int] = None):
+        """
+        Find the records having the given primary key with a full table scan, see scan_for_field().
+        :param encoded_key: The encoded primary key.
+        :param file_indices: Indexes of the files to scan, defaults to all files of the table.
+        :return: A generator of the locations of the matching records, in the order of file index, page number and slot.
+        """
+        return self.scan_for_field(self.pk_idx, encoded_key, file_indices=file_indices)
+
+    def scan_for_field(self, field_idx: int, value: bytes|int, high: int = None, file_indices: List[int] = None):
+        """
+        Find the records having a value in a field, or a value in a range for int fields, with a full table scan.
+        Large scans run in the worker processes of the scan pool, each reading a file or a range of pages directly
+        (see DBMS/FileScanner.py and DBMS/ScanPool.py), and the remaining tasks are cancelled once the caller stops
+        iterating. For the fixed format, smaller scans read the files directly as well, in this process. Pages of the
+        slotted format are then read through the buffer pool and compared one by one, as are the pages of files
+        modified since the last commit of the write-ahead log, which cannot be written back yet.
+        :param field_idx: Index of the field.
+        :param value: The value encoded as by RecordCodec.encode_field(), or the smallest int of the range if high is given.
+        :param high: The largest int of the range.
+        :param file_indices: Indexes of the files to scan, defaults to all files of the table.
+        :return: A generator of the locations of the matching records, in the order of file index, page number and slot.
+        """
+        if file_indices is None:
+            file_indices = range(1, len(self.files) + 1)
+        file_indices = list(file_indices)
+        scan_size = sum(os.path.getsize(self._file_path(file_index)) for file_index in file_indices)
+        if stats.enabled:
+            stats.add("full_scans")
+            stats.add("scanned_bytes", scan_size)
+        # files with uncommitted pages are compared in the buffer pool, the others are brought up to date on disk
+        cached_indices = {file_index for file_index in file_indices if buffer_pool.has_uncommitted(self._file_path(file_index))}
+        if len(file_indices) > len(cached_indices) and scan_pool.is_parallel(scan_size):
+            page_ranges = scan_pool.page_ranges(len(file_indices), self.PAGES_PER_FILE)
+            tasks = [] # arguments of FileScanner.scan_field() for each task, in the order of the files
+            for file_index in file_indices:
+                if file_index not in cached_indices:
+                    buffer_pool.flush(self._file_path(file_index)) # the workers read the files, modified pages must be on disk
+                    tasks += [(self._file_path(file_index), field_idx, value, high, first_page, end_page)
+                              for first_page, end_page in page_ranges]
+            results = scan_pool.map(self.scanner.scan_field, tasks)
+            for file_index in file_indices:
+                if file_index in cached_indices:
+                    yield from self._scan_cached_file(file_index, field_idx, value, high)
+                    continue
+                for _ in page_ranges:
+                    for page_number, slot in next(results):
+                        yield file_index, page_number, slot
+            return
+
+        for file_index in file_indices:
+            file_path = self._file_path(file_index)
+            if self.page_format.name != "fixed" or file_index in cached_indices:
+                yield from self._scan_cached_file(file_index, field_idx, value, high)
+                continue
+
+            buffer_pool.flush(file_path) # the scan reads the file directly, modified pages must be on disk
+            for page_number, slot in self.scanner.scan_field(file_path, field_idx, value, high):
+                yield file_index, page_number, slot
+
+    def _scan_cached_file(self, file_index: int, field_idx: int, value: bytes|int, high: Optional[int]):
+        # locations of the records of a file matching scan_for_field(), reading its pages through the buffer pool
+        file_path = self._file_path(file_index)
+        matches_field = field_matcher(value, high)
+        file_bitmap = int.from_bytes(self._file_header(file_path), 'big')
+        for page_number in range(self.PAGES_PER_FILE):
+            if not file_bitmap & (1 << page_number):
+                continue
+            page = self._page(file_path, page_number)
+            for slot in self.page_format.occupied_slots(page):
+                if stats.enabled:
+                    stats.add("slots_read")
+                if matches_field(self.page_format.field_at(page, slot, field_idx)):
+                    yield file_index, page_number, slot
+
+    def read_record(self, file_index: int, page_number: int, slot: int) -> Optional[Dict[str, str|int]]:
+        """
+        Read the record stored at a specific location.
+        :param file_index: Index of the file the record is stored in.
+        :param page_number: Page number of the record in the file.
+        :param slot: Slot index of the record in the page.
+        :return: The decoded record, or None if the slot is empty.
+        """
+        file_path = self._file_path(file_index)
+        if not os.path.exists(file_path):
+            return None
+        page = self._page(file_path, page_number)
+        if not self.page_format.is_occupied(page, slot):
+            return None
+        if stats.enabled:
+            stats.add("records_decoded")
+        return self.page_format.decode_at(page, slot)
+
+    def iterate_records(self):
+        """
+        Iterate over all records in the table, reading the files page by page.
+        :return: A generator of (record, file path, page number, slot) tuples.
+        """
+        for file_path in self.files:
+            yield from self._iterate_file(file_path)
+
+    def scan(self) -> Iterator[Dict[str, str|int]]:
+        """
+        Iterate over all records in the table, in the order they are stored.
+        Pages are read and decoded one at a time, so memory use does not grow with the size of the table. The table
+        must not be modified before the iteration ends.
+        :return: A generator of the records.
+        """
+        for record, _, _, _ in self.iterate_records():
+            yield record
+
+    def export_csv(self, file_path: str) -> int:
+        """
+        Write all records of the table to a CSV file, with a header row of the field names.
+        :param file_path: Path of the CSV file, replaced if it exists.
+        :return: Number of records written.
+        """
+        field_names = list(self.fields)
+        record_count = 0
+        with open(file_path, 'w', newline='', buffering=self.CSV_BUFFER_SIZE) as f:
+            writer = csv.writer(f)
+            writer.writerow(field_names)
+            for record in self.scan():
+                writer.writerow([record[field_name] for field_name in field_names])
+                record_count += 1
+        return record_count
+
+    def import_csv(self, file_path: str, commit: Callable[[], None] = None) -> Tuple[int, int]:
+        """
+        Add the records of a CSV file to the table, as written by export_csv().
+        The header row must list the fields of the table in order. The rows are inserted in blocks with bulk_insert(),
+        so pages are filled one at a time, and rows rejected by it are skipped.
+        :param file_path: Path of the CSV file.
+        :param commit: Called after each block, e.g. to commit it to the write-ahead log so the pages it modified can be
+                       written back before the next block.
+        :return: Number of records added and number of rows read.
+        """
+        added_count = row_count = 0
+        with open(file_path, 'r', newline='', buffering=self.CSV_BUFFER_SIZE) as f:
+            reader = csv.reader(f)
+            header = next(reader, None)
+            if header != list(self.fields):
+                raise ValueError(f"CSV header {header} does not match the fields of '{self.table_name}': {list(self.fields)}.")
+            while True:
+                rows = list(islice(reader, self.IMPORT_BLOCK_ROWS))
+                if not rows:
+                    break
+                added_count += sum(self.bulk_insert(rows))
+                row_count += len(rows)
+                if commit is not None:
+                    commit()
+        return added_count, row_count
+
+    def _iterate_file(self, file_path: str):
+        file_bitmap = int.from_bytes(self._file_header(file_path), 'big')
+
+        # iterate over pages in file
+        for page_number in range(self.PAGES_PER_FILE):
+            if not file_bitmap & (1 << page_number):
+                continue
+
+            # decode the occupied slots of the page at once, before the caller gets a chance to modify the page
+            records = self.page_format.records(self._page(file_path, page_number))
+            if stats.enabled:
+                stats.add("records_decoded", len(records))
+            for slot, entry in records:
+                yield entry, file_path, page_number, slot
+
+    def rebuild_index(self) -> None:
+        """
+        Rebuild the primary key index from the records in the heap files.
+        """
+        pk = list(self.fields.keys())[self.pk_idx]
+        self.pk_index.clear()
+        for entry, file_path, page_number, slot in self.iterate_records():
+            self.pk_index.insert(self.encode_key(entry[pk]), (self._file_index(file_path), page_number, slot))
+
+
+    def rebuild_bloom_filter(self, file_index: int = None) -> None:
+        """
+        Rebuild the bloom filter of a heap file from its records, dropping the keys deleted from it.
+        :param file_index: Index of the file, if not given the filters of all files are rebuilt.
+        """
+        file_indices = [file_index] if file_index is not None else range(1, len(self.files) + 1)
+        pk = list(self.fields.keys())[self.pk_idx]
+        for file_index in file_indices:
+            self.bloom_filter.replace(file_index, [self.bloom_filter.positions(self.encode_key(entry[pk]))
+                                                   for entry, _, _, _ in self._iterate_file(self._file_path(file_index))])
+
+    def _open_secondary_index(self, index_entry: dict) -> HashIndex | SortedIndex:
+        file_path = os.path.join(DISK_PATH, index_entry["file"])
+        return SortedIndex(file_path) if index_entry["type"] == "sorted" else HashIndex(file_path)
+
+    def _add_to_secondary_indexes(self, record: Dict[str, str|int], rid: RecordId) -> None:
+        for field_name, index in self.secondary_indexes.items():
+            if isinstance(index, SortedIndex):
+                index.insert(record[field_name], rid)
+            else:
+                index.insert(self.codec.encode_field(self.field_indices[field_name], record[field_name]), rid)
+
+    def _remove_from_secondary_indexes(self, record: Dict[str, str|int], rid: RecordId) -> None:
+        for field_name, index in self.secondary_indexes.items():
+            if isinstance(index, SortedIndex):
+                index.delete(record[field_name], rid)
+            else:
+                index.delete(self.codec.encode_field(self.field_indices[field_name], record[field_name]), rid)
+
+    def create_index(self, field_name: str, index_type: str = None) -> None:
+        """
+        Create a secondary index over a field and build it from the records in the heap files.
+        Inserting and deleting records keeps it up to date from then on.
+        :param field_name: Name of the field.
+        :param index_type: `hash` for equality queries, or `sorted` for equality and range queries on an int field.
+                           Defaults to `sorted` for int fields and `hash` for str fields.
+        """
+        if field_name not in self.fields:
+            raise ValueError(f"Field '{field_name}' does not exist in table '{self.table_name}'.")
+        if field_name in self.secondary_indexes:
+            raise ValueError(f"Field '{field_name}' of table '{self.table_name}' is already indexed.")
+        field_type = self.fields[field_name]
+        if index_type is None:
+            index_type = "sorted" if field_type == "int" else "hash"
+        if index_type not in self.SECONDARY_INDEX_TYPES:
+            raise ValueError(f"Unsupported index type '{index_type}', expected one of {', '.join(self.SECONDARY_INDEX_TYPES)}.")
+        if index_type == "sorted" and field_type != "int":
+            raise ValueError("Sorted indexes are only supported on int fields.")
+
+        index_entry = {"type": index_type, "file": f"{self.table_name}_{field_name}_{index_type}.idx"}
+        index = self._open_secondary_index(index_entry)
+        index.clear()
+        self.secondary_indexes[field_name] = index
+        for entry, file_path, page_number, slot in self.iterate_records():
+            rid = (self._file_index(file_path), page_number, slot)
+            if isinstance(index, SortedIndex):
+                index.insert(entry[field_name], rid)
+            else:
+                index.insert(self.codec.encode_field(self.field_indices[field_name], entry[field_name]), rid)
+            buffer_pool.commit_if_full() # the index is unused until it is saved in the catalog below
+
+        self.catalog_entry.setdefault("secondary_indexes", {})[field_name] = index_entry
+        self.catalog.save_entry(self.table_name, self.catalog_entry)
+
+    def search_by(self, field_name: str, value: str|int, high: str|int = None) -> List[tuple[dict[str, str | int], str, int, int]]:
+        """
+        Search for the records having a value in a field, or a value in a range for int fields.
+        The secondary index of the field is probed if there is one and can answer the query, so only the pages of the
+        matching records are read. Otherwise the table is scanned.
+        :param field_name: Name of the field.
+        :param value: The searched value, or the smallest value of the range if high is given.
+        :param high: The largest value of the range.
+        :return: The records and their locations, in the order of location, or of value and then location for ranges.
+        """
+        if field_name not in self.fields:
+            raise ValueError(f"Field '{field_name}' does not exist in table '{self.table_name}'.")
+        field_idx = self.field_indices[field_name]
+        index = self.secondary_indexes.get(field_name)
+
+        if high is not None:
+            if self.fields[field_name] != "int":
+                raise ValueError("Range queries are only supported on int fields.")
+            low, high = int(value), int(high)
+            if isinstance(index, SortedIndex):
+                candidates = [rid for _, rid in index.range(low, high)]
+                return [result for result in map(self._read_located, candidates) if result is not None]
+            # the bounds are clamped to the values an int field can hold, so the scan compares them as stored
+            locations = self.scan_for_field(field_idx, max(low, INT_MIN), min(high, INT_MAX))
+            matches = [result for result in map(self._read_located, locations) if result is not None]
+            return sorted(matches, key=lambda result: result[0][field_name]) # stable, so equal values stay in order
+
+        if field_idx == self.pk_idx and index is None:
+            search_result = self.search_record(value)
+            return [search_result] if search_result is not None else []
+        try:
+            encoded_value = self.codec.encode_field(field_idx, value)
+        except (ValueError, OverflowError):
+            return [] # the value cannot be stored in this field, so no record can have it
+
+        if index is None:
+            # the field is compared without decoding the records, only the matching ones are read
+            return [result for result in map(self._read_located, self.scan_for_field(field_idx, encoded_value)) if result is not None]
+        if isinstance(index, SortedIndex):
+            candidates = index.lookup(int(value))
+        else:
+            candidates = sorted(index.lookup(encoded_value)) # hash index candidates share the hash of the value only
+        results = []
+        for result in map(self._read_located, candidates):
+            if result is not None and self.codec.encode_field(field_idx, result[0][field_name]) == encoded_value:
+                results.append(result)
+        return results
+
+    def _read_located(self, rid: RecordId) -> Optional[tuple[dict[str, str | int], str, int, int]]:
+        # the record at a location with the location, in the form search_record() returns it, or None if it is empty
+        file_index, page_number, slot = rid
+        record = self.read_record(file_index, page_number, slot)
+        if record is None:
+            return None
+        return record, self._file_path(file_index), page_number, slot
 
     def encode_record(self, field_values: Tuple[str|int]) -> bytes:
         """
         Encode a record from a tuple of field values to bytes.
         :param field_values: A tuple containing the field values to be encoded.
-        :return: Bytes representation of the record.
+        :return: Bytes representation of the record, in the page format of the table.
         """
-        if len(field_values) != self.field_count:
-            raise ValueError(f"Expected {self.field_count} field values, but got {len(field_values)}.")
+        return self.page_format.encode(field_values)
 
-        entry = bytearray()
-        i = 0
-        for _, field_type in self.fields.items():
-            if field_type == "int":
-                entry.extend(int(field_values[i]).to_bytes(4, 'big', signed=True))
-                i += 1
-            elif field_type == "str":
-                field_value = str(field_values[i]).encode('utf-8')
-                if len(field_value) > 256:
-                    raise ValueError(f"String value '{field_value}' exceeds maximum length of 256 characters.")
-                entry.extend(field_value.ljust(256, b'\x00'))
-                i += 1
-        return entry
+    def encode_key(self, pk_value: str|int) -> bytes:
+        """
+        Encode a primary key value the same way it is stored in a record.
+        :param pk_value: The primary key value.
+        :return: Bytes representation of the primary key field.
+        """
+        return self.codec.encode_key(pk_value)
 
     def decode(self, entry: bytes) -> Dict[str, str|int]:
         """
@@ -264,18 +808,9 @@ class Table:
         :param entry: The bytes representation of the record.
         :return: A dictionary with field names as keys and field values as values.
         """
-        record = {}
-        offset = 0
-        for field_name, field_type in self.fields.items():
-            if field_type == "int":
-                record[field_name] = int.from_bytes(entry[offset:offset + 4], 'big', signed=True)
-                offset += 4
-            elif field_type == "str":
-                record[field_name] = entry[offset:offset + 256].decode('utf-8').rstrip('\x00')
-                offset += 256
-            else:
-                raise ValueError(f"Unsupported field type '{field_type}'.")
-        return record
+        if stats.enabled:
+            stats.add("records_decoded")
+        return self.page_format.decode(entry)
 
     def delete_record(self, pk_value: str | int) -> bool:
         """
@@ -287,31 +822,181 @@ class Table:
         search_result = self.search_record(pk_value)
         if search_result is None:
             return False# No record found with the given primary key, nothing to delete
-        _, file_path, page_number, slot_idx = search_result
-
-        with open(file_path, 'r+b') as f:
-            # seek to the page header
-            f.seek(self.FILE_HEADER_SIZE + page_number * self.page_size)
-            page_header = f.read(self.PAGE_HEADER_SIZE)
-            page_bitmap = int.from_bytes(page_header, 'big')
-
-            # clear the slot in the bitmap
-            page_bitmap &= ~(1 << slot_idx)
-
-            # write the updated bitmap back to the file
-            f.seek(self.FILE_HEADER_SIZE + page_number * self.page_size)
-            f.write(page_bitmap.to_bytes(self.PAGE_HEADER_SIZE, 'big'))
-
-            # clear the entry in the page, isn't strictly necessary after marking the slot as empty but might prevent bugs
-            f.seek(self.FILE_HEADER_SIZE + page_number * self.page_size + self.PAGE_HEADER_SIZE + slot_idx * self.entry_size)
-            f.write(bytearray(self.entry_size))
-
-            # check if the page is now empty, if so, update the file header
-            if page_bitmap == 0:
-                f.seek(0)
-                file_header = f.read(self.FILE_HEADER_SIZE)
-                file_bitmap = int.from_bytes(file_header, 'big')
-                file_bitmap &= ~(1 << page_number)
-                f.seek(0)
-                f.write(file_bitmap.to_bytes(self.FILE_HEADER_SIZE, 'big'))
+        entry, file_path, page_number, slot_idx = search_result
+
+        page = self._page(file_path, page_number)
+        self.page_format.delete(page, slot_idx)
+        buffer_pool.mark_dirty(file_path, page_number)
+
+        # check if the page is now empty, if so, update the file header
+        if self.page_format.is_empty(page):
+            file_header = self._file_header(file_path)
+            file_bitmap = int.from_bytes(file_header, 'big')
+            file_bitmap &= ~(1 << page_number)
+            file_header[:] = file_bitmap.to_bytes(self.FILE_HEADER_SIZE, 'big')
+            buffer_pool.mark_dirty(file_path, FILE_HEADER_PAGE)
+
+        # the page has room for a record now
+        if self.page_format.has_room(self._page(file_path, page_number)):
+            self.free_space_map.mark_free(self._file_index(file_path), page_number)
+
+        pk = list(self.fields.keys())[self.pk_idx]
+        self.pk_index.delete(self.encode_key(entry[pk]), (self._file_index(file_path), page_number, slot_idx))
+        self.bloom_filter.record_delete(self._file_index(file_path))
+        if self.bloom_filter.is_stale(self._file_index(file_path)):
+            self.rebuild_bloom_filter(self._file_index(file_path)) # too many deleted keys, the filter rules out too few
+        self._remove_from_secondary_indexes(entry, (self._file_index(file_path), page_number, slot_idx))
         return True
+
+    def convert(self, page_format: str) -> None:
+        """
+        Convert the heap files of the table to another page format, rewriting all of its records.
+        The old files are renamed and read page by page, so the records never have to fit in memory at once. They are
+        kept until the new files are complete, so a crash in between is undone when the table is opened again.
+        :param page_format: Name of the new page format, one of PAGE_FORMATS.
+        """
+        if page_format not in PAGE_FORMATS:
+            raise ValueError(f"Unsupported page format '{page_format}', expected one of {', '.join(PAGE_FORMATS)}.")
+        if page_format == self.page_format.name:
+            return
+        make_page_format(page_format, self.codec, self.page_size, self.PAGE_SLOTS, self.PAGE_HEADER_SIZE) # validates the page size
+        self._rewrite(page_format)
+
+    def vacuum(self) -> Tuple[int, int]:
+        """
+        Pack the records of the table into as few pages as possible, dropping the pages and files left empty by
+        deletions. Records are rewritten page by page like in convert(), and the indexes, the free space map and the
+        bloom filters are rebuilt along the way.
+        :return: The number of bytes and the number of pages of heap files reclaimed.
+        """
+        old_size, old_page_count = self._heap_file_usage()
+        self._rewrite(self.page_format.name)
+        new_size, new_page_count = self._heap_file_usage()
+        return old_size - new_size, old_page_count - new_page_count
+
+    def _heap_file_usage(self) -> Tuple[int, int]:
+        # total size in bytes and number of pages of the heap files, as written to disk
+        total_size = 0
+        page_count = 0
+        for file_path in self.files:
+            buffer_pool.flush(file_path)
+            file_size = os.path.getsize(file_path)
+            total_size += file_size
+            page_count += -(-max(0, file_size - self.FILE_HEADER_SIZE) // self.page_size)
+        return total_size, page_count
+
+    def _make_durable(self) -> None:
+        # write back and sync every page and the catalog, the steps of a rewrite are not logged
+        buffer_pool.flush()
+        buffer_pool.sync_files()
+        sync_directory(DISK_PATH)
+        self.catalog.save_entry(self.table_name, self.catalog_entry)
+        self.catalog.flush()
+        sync_directory(DISK_PATH)
+
+    def _rewrite(self, page_format: str) -> None:
+        # rewrite all records of the table into new heap files in the given page format, filling their pages in order
+        # the rewrite is recorded in the catalog entry before any file is touched, along with the entry as it was. The
+        # catalog keeps writing that entry until the new files are complete, see Catalog.flush() and _recover_rewrite()
+        self.catalog_entry["rewrite"] = {"state": "started", "entry": copy.deepcopy(self.catalog_entry)}
+        try:
+            self._rewrite_files(page_format)
+        except Exception:
+            # undo the rewrite the way it is undone after a crash: the pages of the new files are dropped unwritten and
+            # the table is loaded again, which moves the old files back and rebuilds the indexes from them
+            for file_path in self.files:
+                buffer_pool.discard(file_path)
+            self.catalog.invalidate(self.table_name)
+            self.catalog.get_table(self.table_name)
+            raise
+
+    def _rewrite_files(self, page_format: str) -> None:
+        self._make_durable()
+
+        # move the old files aside, their pages are read with the old format while the new files are written
+        old_format = self.page_format
+        old_files = []
+        for file_path in self.files:
+            buffer_pool.flush(file_path)
+            buffer_pool.discard(file_path)
+            os.replace(file_path, file_path + ".old")
+            old_files.append(file_path + ".old")
+        sync_directory(DISK_PATH)
+
+        self.catalog_entry["page_format"] = page_format
+        self._load_page_format()
+        self.file_count = len(self.partitions) if self.partitions is not None else 1 # one file per partition again
+        self.catalog_entry["file_count"] = self.file_count
+        self.files = [self._file_path(file_index) for file_index in range(1, self.file_count + 1)]
+        for file_path in self.files:
+            open(file_path, 'wb')
+        if self.partitions is not None:
+            self.partitions[:] = [[file_index] for file_index in range(1, self.file_count + 1)]
+        self.pk_index.clear()
+        for index in self.secondary_indexes.values():
+            index.clear()
+        self.free_space_map.reset(self.file_count)
+
+        # bloom filters are sized for the page format, replace them with new ones
+        buffer_pool.discard(self.bloom_filter.file_path)
+        os.remove(self.bloom_filter.file_path)
+        self.catalog_entry["bloom_filter"] = self._bloom_filter_entry(self.page_format, self.PAGES_PER_FILE)
+        self.bloom_filter = BloomFilter(self.bloom_filter.file_path, self.catalog_entry["bloom_filter"]["bits"],
+                                        self.catalog_entry["bloom_filter"]["hashes"], 0)
+        self.bloom_filter.reset(self.file_count)
+
+        for old_file in old_files:
+            file_bitmap = int.from_bytes(self._file_header(old_file), 'big')
+            for page_number in range(self.PAGES_PER_FILE):
+                if not file_bitmap & (1 << page_number):
+                    continue
+                records = []
+                for _, entry in old_format.records(self._page(old_file, page_number)):
+                    field_values = tuple(entry.values())
+                    records.append((self.encode_record(field_values), self.encode_key(field_values[self.pk_idx])))
+                self._place_records(records)
+            buffer_pool.discard(old_file)
+
+        # the new files and the entry describing them are durable before the old files are removed
+        self.catalog_entry["rewrite"]["state"] = "done"
+        self._make_durable()
+        for old_file in old_files:
+            os.remove(old_file)
+        del self.catalog_entry["rewrite"]
+        self.catalog.save_entry(self.table_name, self.catalog_entry)
+
+    def _recover_rewrite(self) -> Dict[str, dict]:
+        # finish a rewrite whose new files are complete by removing the old files. Otherwise undo it: move the old
+        # files back, drop the new ones, restore the entry as it was before the rewrite, and drop the indexes, free
+        # space map and bloom filters, which were rewritten in part, so they are built from the old files again
+        # :return: Secondary index entries of the table, to be built again by create_index() once the table is loaded.
+        rewrite = self.catalog_entry.pop("rewrite")
+        old_file_count = rewrite["entry"]["file_count"]
+        rebuilt_indexes = {}
+        if rewrite["state"] == "done":
+            for file_index in range(1, old_file_count + 1):
+                if os.path.exists(self._file_path(file_index) + ".old"):
+                    os.remove(self._file_path(file_index) + ".old")
+        else:
+            for file_index in range(1, old_file_count + 1):
+                buffer_pool.discard(self._file_path(file_index) + ".old")
+                if os.path.exists(self._file_path(file_index) + ".old"): # files not renamed yet are already in place
+                    buffer_pool.discard(self._file_path(file_index))
+                    os.replace(self._file_path(file_index) + ".old", self._file_path(file_index))
+            file_index = old_file_count + 1
+            while os.path.exists(self._file_path(file_index)):
+                buffer_pool.discard(self._file_path(file_index))
+                os.remove(self._file_path(file_index))
+                file_index += 1
+            self.catalog_entry = rewrite["entry"]
+            rebuilt_indexes = self.catalog_entry.pop("secondary_indexes", {})
+            structure_entries = [self.catalog_entry.pop(key, None) for key in ("pk_index", "free_space_map", "bloom_filter")]
+            for structure_entry in structure_entries + list(rebuilt_indexes.values()):
+                if structure_entry is None:
+                    continue
+                file_path = os.path.join(DISK_PATH, structure_entry["file"])
+                buffer_pool.discard(file_path)
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+        self.catalog.save_entry(self.table_name, self.catalog_entry)
+        return rebuilt_indexes
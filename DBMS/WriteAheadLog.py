@@ -0,0 +1,273 @@
+import json
+import os
+import struct
+import time
+import zlib
+from contextlib import contextmanager
+from typing import List, Tuple
+from DBMS.BufferPool import BufferPool, buffer_pool as shared_buffer_pool
+from DBMS.Catalog import Catalog, catalog as shared_catalog
+from DBMS.Stats import stats
+from DBMS.utils import DISK_PATH, sync_directory
+
+# record types
+PAGE_RECORD = 1 # bytes written to a file at an offset
+CATALOG_RECORD = 2 # catalog entries replaced or deleted
+COMMIT_RECORD = 3 # end of the records of a command
+
+RECORD_HEADER = struct.Struct('>BII') # record type, payload length, crc32 of the type and payload
+PAGE_RECORD_HEADER = struct.Struct('>HQ') # length of the file path, offset in the file
+
+
+class WriteAheadLog:
+    def __init__(self, file_path: str, pool: BufferPool = None, catalog: Catalog = None,
+                 group_commit_size: int = 100, group_commit_delay: float = 0.5, max_log_size: int = 64 * 1024 * 1024):
+        """
+        Initialize a redo-only write-ahead log protecting the pages of a buffer pool and the entries of a catalog.
+
+        Each command is committed as a group of records: the changes of every page modified by the command, the
+        catalog entries it changed, and a commit record. The first change of a page after a checkpoint is logged as
+        the whole page, later ones as the changed byte ranges only. Pages modified by a command are kept in the
+        buffer pool until it is committed (no-steal), so the files never contain changes of unfinished commands and
+        recovery only has to redo the committed ones.
+
+        The log is synced once per group of commits rather than once per command. A checkpoint writes all pages and
+        the catalog to disk, syncs them and empties the log.
+
+        Record Structure: [ type (1) | payload length (4) | crc32 (4) | payload ]
+        Page Record Payload: [ file path length (2) | offset (8) | file path | bytes ]
+        Catalog Record Payload: JSON object of the changed entries, null for deleted entries
+        Commit Record Payload: empty
+
+        :param file_path: Path of the log file.
+        :param pool: Buffer pool whose pages are logged, defaults to the shared buffer pool.
+        :param catalog: Catalog whose entries are logged, defaults to the shared catalog.
+        :param group_commit_size: Number of commits after which the log is synced, 1 syncs every commit.
+        :param group_commit_delay: Number of seconds after the last sync after which the next commit syncs the log.
+        :param max_log_size: Size of the log file in bytes that triggers a checkpoint.
+        """
+
+        # constants, pages are compared in blocks and the changed blocks in chunks, to find the changed byte ranges
+        self.DIFF_BLOCK_SIZE = 512
+        self.DIFF_CHUNK_SIZE = 64
+
+        self.file_path = file_path
+        self.pool = pool if pool is not None else shared_buffer_pool
+        self.catalog = catalog if catalog is not None else shared_catalog
+        self.group_commit_size = group_commit_size
+        self.group_commit_delay = group_commit_delay
+        self.max_log_size = max_log_size
+
+        self.relative_paths = {} # file paths of the pool, relative to the disk directory as they are logged
+        self.file = None
+        self.log_size = 0 # bytes in the log file
+        self.end_lsn = 0 # log sequence number after the last record, the number of bytes ever appended to the log
+        self.synced_lsn = 0 # log sequence number up to which the log is on disk
+        self.unsynced_commits = 0
+        self.last_sync = time.monotonic()
+
+    def recover(self) -> int:
+        """
+        Redo the committed commands found in the log, then take a checkpoint.
+        Records after the last commit record belong to a command that did not finish and are ignored, as are records
+        cut short or corrupted by a crash while the log was being written.
+        Must be called before any page of the logged files is cached in the buffer pool.
+        :return: Number of commands redone.
+        """
+        if not os.path.exists(self.file_path):
+            return 0
+        with open(self.file_path, 'rb') as f:
+            log = f.read()
+
+        pending = [] # records of the command being read
+        redone = 0
+        position = 0
+        while position + RECORD_HEADER.size <= len(log):
+            record_type, length, checksum = RECORD_HEADER.unpack_from(log, position)
+            payload = log[position + RECORD_HEADER.size:position + RECORD_HEADER.size + length]
+            if len(payload) < length or zlib.crc32(bytes([record_type]) + payload) != checksum:
+                break # the log ends with a partially written record
+            position += RECORD_HEADER.size + length
+
+            if record_type == COMMIT_RECORD:
+                for pending_type, pending_payload in pending:
+                    self._redo(pending_type, pending_payload)
+                pending = []
+                redone += 1
+            else:
+                pending.append((record_type, payload))
+
+        self.checkpoint()
+        return redone
+
+    def _redo(self, record_type: int, payload: bytes) -> None:
+        if record_type == PAGE_RECORD:
+            path_length, offset = PAGE_RECORD_HEADER.unpack_from(payload)
+            data_start = PAGE_RECORD_HEADER.size + path_length
+            file_path = os.path.join(DISK_PATH, payload[PAGE_RECORD_HEADER.size:data_start].decode('utf-8'))
+            with open(file_path, 'r+b' if os.path.exists(file_path) else 'w+b') as f:
+                f.seek(offset)
+                f.write(payload[data_start:])
+            self.pool.unsynced_files.add(file_path)
+        elif record_type == CATALOG_RECORD:
+            for entry_key, entry in json.loads(payload).items():
+                if entry is None:
+                    self.catalog.delete_entry(entry_key)
+                else:
+                    self.catalog.save_entry(entry_key, entry)
+
+    def attach(self) -> None:
+        """
+        Start logging the changes of the buffer pool and the catalog.
+        """
+        if self.file is None:
+            os.makedirs(os.path.dirname(self.file_path), exist_ok=True)
+            self.file = open(self.file_path, 'ab')
+            self.log_size = self.file.tell()
+        self.pool.wal = self
+        self.catalog.wal = self
+
+    def detach(self) -> None:
+        """
+        Stop logging the changes of the buffer pool and the catalog.
+        """
+        self.pool.wal = None
+        self.catalog.wal = None
+
+    def _encode_record(self, record_type: int, payload: bytes) -> bytes:
+        return RECORD_HEADER.pack(record_type, len(payload), zlib.crc32(bytes([record_type]) + payload)) + payload
+
+    def _page_record(self, file_path: str, offset: int, data: bytes) -> bytes:
+        relative_path = self.relative_paths.get(file_path)
+        if relative_path is None:
+            relative_path = self.relative_paths[file_path] = os.path.relpath(file_path, DISK_PATH).encode('utf-8')
+        return self._encode_record(PAGE_RECORD, PAGE_RECORD_HEADER.pack(len(relative_path), offset) + relative_path + data)
+
+    def _changed_ranges(self, old: bytes, new: bytes) -> List[Tuple[int, int]]:
+        # (start, end) of the runs of chunks that differ between the two versions of a page
+        ranges = []
+        for block_start in range(0, len(new), self.DIFF_BLOCK_SIZE):
+            block_end = min(block_start + self.DIFF_BLOCK_SIZE, len(new))
+            if new[block_start:block_end] == old[block_start:block_end]:
+                continue
+            for start in range(block_start, block_end, self.DIFF_CHUNK_SIZE):
+                end = min(start + self.DIFF_CHUNK_SIZE, block_end)
+                if new[start:end] != old[start:end]:
+                    if ranges and ranges[-1][1] == start:
+                        ranges[-1] = (ranges[-1][0], end)
+                    else:
+                        ranges.append((start, end))
+        return ranges
+
+    def commit(self) -> None:
+        """
+        Log the changes made since the last commit as one command. Commands that changed nothing are not logged.
+        The log is synced if enough commits or time accumulated since the last sync, and a checkpoint is taken if the
+        log grew too large.
+        """
+        records = []
+        committed_frames = []
+        for key in self.pool.uncommitted:
+            file_path = key[0]
+            frame = self.pool.frames[key] # modified pages are pinned until they are committed
+            if frame.image is None:
+                records.append(self._page_record(file_path, frame.offset, bytes(frame.data)))
+            else:
+                for start, end in self._changed_ranges(frame.image, frame.data):
+                    records.append(self._page_record(file_path, frame.offset + start, bytes(frame.data[start:end])))
+            self.pool.keep_image(key)
+            committed_frames.append(frame)
+
+        changes = self.catalog.take_changes()
+        if changes:
+            records.append(self._encode_record(CATALOG_RECORD, json.dumps(changes).encode('utf-8')))
+        if not records:
+            self.pool.release_uncommitted()
+            return
+        records.append(self._encode_record(COMMIT_RECORD, b''))
+
+        group = b''.join(records)
+        self.file.write(group)
+        self.log_size += len(group)
+        self.end_lsn += len(group)
+        if stats.enabled:
+            stats.add("wal_bytes_written", len(group))
+        for frame in committed_frames:
+            frame.lsn = self.end_lsn
+        self.pool.release_uncommitted() # the pages can be written back once the log is synced up to their records
+
+        self.unsynced_commits += 1
+        if (self.unsynced_commits >= self.group_commit_size
+                or time.monotonic() - self.last_sync >= self.group_commit_delay):
+            self.sync()
+        if self.log_size >= self.max_log_size:
+            self.checkpoint()
+
+    def sync(self) -> None:
+        """
+        Make every committed command durable, by syncing the log file.
+        """
+        self.last_sync = time.monotonic()
+        self.unsynced_commits = 0
+        if self.file is None or self.synced_lsn == self.end_lsn:
+            return
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.synced_lsn = self.end_lsn
+        if stats.enabled:
+            stats.add("wal_syncs")
+
+    def checkpoint(self) -> None:
+        """
+        Write all committed pages and catalog entries to disk and sync them, then empty the log.
+        """
+        if stats.enabled:
+            stats.add("checkpoints")
+        self.sync()
+        self.pool.flush()
+        self.pool.sync_files()
+        if os.path.isdir(DISK_PATH):
+            sync_directory(DISK_PATH) # files created since the last checkpoint must be durable as well
+        self.catalog.flush()
+
+        # the next change of each page is logged as the whole page again, in case the page is torn by a crash
+        self.pool.drop_images()
+
+        if self.file is not None:
+            self.file.truncate(0)
+            os.fsync(self.file.fileno())
+            self.log_size = 0
+        elif os.path.exists(self.file_path):
+            with open(self.file_path, 'r+b') as f:
+                f.truncate(0)
+                os.fsync(f.fileno())
+
+    @contextmanager
+    def unlogged(self):
+        """
+        Run an operation that rewrites whole files without logging its changes, such as converting a table.
+        A checkpoint is taken before and after it, so the log never refers to files the operation replaced. The
+        operation itself is not protected against crashes.
+        """
+        self.commit()
+        self.checkpoint()
+        self.detach()
+        try:
+            yield
+        finally:
+            self.checkpoint()
+            self.attach()
+
+    def close(self) -> None:
+        """
+        Take a final checkpoint and close the log. If there are uncommitted changes, for example because a command
+        was interrupted, the log is only synced and kept, so the next run recovers the committed commands instead.
+        """
+        if self.pool.uncommitted or self.catalog.uncommitted:
+            self.sync()
+        else:
+            self.checkpoint()
+        self.detach()
+        if self.file is not None:
+            self.file.close()
+            self.file = None
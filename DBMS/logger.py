@@ -1,8 +1,14 @@
+import atexit
 import os
 from enum import Enum
 from .utils import PROJECT_ROOT
+from .BufferedWriter import BufferedWriter
 import time
 
+# log lines are buffered and appended to the log file in groups, see set_strict() to write every line immediately
+log_writer = BufferedWriter(os.path.join(PROJECT_ROOT, 'log.csv'))
+atexit.register(log_writer.close)
+
 class LogStatus(Enum):
     BEGIN = "BEGIN"
     SUCCESS = "success"
@@ -19,24 +25,29 @@ def log_command(message: str, status: LogStatus) -> None:
     """
 
     message = message.strip()
-    log_file_path = os.path.join(PROJECT_ROOT, 'log.csv')
-
-    # Ensure the log directory exists
-    if not os.path.exists(log_file_path):
-        f = open(log_file_path, 'w')
-    else:
-        f = open(log_file_path, 'a')
 
     if status == LogStatus.BEGIN:
         log = f"{int(time.time())}, {message}, {status.value}\n"
-        f.write(log)
+        log_writer.write(log)
     elif status == LogStatus.SUCCESS:
         log = f"{int(time.time())}, {message}, {status.value}\n"
-        f.write(log)
+        log_writer.write(log)
     elif status == LogStatus.FAILURE:
         log = f"{int(time.time())}, {message}, {status.value}\n"
-        f.write(log)
+        log_writer.write(log)
     else:
         raise ValueError(f"Invalid status '{status}'. Expected 'BEGIN', 'SUCCESS', or 'FAILURE'.")
-    f.close()
+
+def flush_log() -> None:
+    """
+    Write the buffered log lines to the log file.
+    """
+    log_writer.flush()
+
+def set_strict(strict: bool) -> None:
+    """
+    Choose whether every log line is written to the log file as soon as it is logged, instead of in groups.
+    :param strict: True to write every line immediately.
+    """
+    log_writer.strict = strict
 
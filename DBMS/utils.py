@@ -1,71 +1,72 @@
 import json
 import os
-from typing import Optional
+from contextlib import contextmanager
 
-# Path definitions
-PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+try:
+    import fcntl # POSIX only, without it the catalog file is not locked against other processes
+except ImportError:
+    fcntl = None
+
+# Path definitions, under the directory of archive.py unless the ARCHIVE_ROOT environment variable names another one
+PROJECT_ROOT = os.path.abspath(os.environ.get('ARCHIVE_ROOT') or os.path.join(os.path.dirname(__file__), '..'))
 DISK_PATH = os.path.join(PROJECT_ROOT, 'disk')
 LOG_DISK_PATH = os.path.join(PROJECT_ROOT, 'log_disk')
 CATALOG_PATH = os.path.join(DISK_PATH, 'catalog.json')
 
-def load_catalog_entry(entry_key: str) -> Optional[dict]:
+def load_catalog() -> dict:
     """
-    Load a specific entry from the catalog.
-    :param entry_key: The key of the entry to load.
-    :return: The catalog entry if found, otherwise None.
+    Load the whole catalog.
+    :return: The catalog, mapping entry keys to entries. Empty if the catalog does not exist or is malformed.
     """
     if not os.path.exists(CATALOG_PATH):
-        return None
+        return {}
     try:
         with open(CATALOG_PATH, 'r') as f:
-            # handle empty file
             content = f.read()
             if not content:
-                return None
-            catalog = json.loads(content)
+                return {}
+            return json.loads(content)
     except (json.JSONDecodeError, FileNotFoundError):
-        return None # Return None if catalog is empty or malformed
-    return catalog.get(entry_key)
+        return {} # Return an empty catalog if catalog is empty or malformed
 
-def save_catalog_entry(entry_key: str, entry_value: dict):
+def save_catalog(catalog: dict):
     """
-    Save a specific entry to the catalog.
-    :param entry_key: The key of the entry to save.
-    :param entry_value: The value of the entry to save.
+    Save the whole catalog, replacing all existing entries.
+    The catalog is written to a temporary file which then replaces the catalog file, so a crash while saving never
+    leaves a truncated catalog behind.
+    :param catalog: The catalog, mapping entry keys to entries.
     """
-    catalog = {}
-    if os.path.exists(CATALOG_PATH):
-        try:
-            with open(CATALOG_PATH, 'r') as f:
-                content = f.read()
-                if content:
-                    catalog = json.loads(content)
-        except (json.JSONDecodeError, FileNotFoundError):
-            pass # if file doesn't exist or is empty, start with an empty catalog
-    catalog[entry_key] = entry_value
-    with open(CATALOG_PATH, 'w') as f:
+    temp_path = CATALOG_PATH + '.tmp'
+    with open(temp_path, 'w') as f:
         json.dump(catalog, f, indent=4)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, CATALOG_PATH)
 
-def delete_catalog_entry(entry_key: str):
+def sync_directory(directory_path: str) -> None:
     """
-    Delete a specific entry from the catalog.
-    :param entry_key: The key of the entry to delete.
+    Make the files created, renamed or removed in a directory durable, by syncing the directory.
+    :param directory_path: Path of the directory.
     """
-    if not os.path.exists(CATALOG_PATH):
-        return
-
-    catalog = {}
+    directory = os.open(directory_path, os.O_RDONLY)
     try:
-        with open(CATALOG_PATH, 'r') as f:
-            content = f.read()
-            if content:
-                catalog = json.loads(content)
-            else:
-                return # empty file, nothing to delete
-    except (json.JSONDecodeError, FileNotFoundError):
-        return # if file is malformed or not found, nothing to delete
+        os.fsync(directory)
+    finally:
+        os.close(directory)
 
-    if entry_key in catalog:
-        del catalog[entry_key]
-        with open(CATALOG_PATH, 'w') as f:
-            json.dump(catalog, f, indent=4)
\ No newline at end of file
+@contextmanager
+def catalog_file_lock():
+    """
+    Hold an exclusive lock on the catalog file while reading and writing it back, so processes changing different
+    entries of the catalog at the same time do not overwrite each other's changes.
+    """
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(DISK_PATH, exist_ok=True)
+    with open(CATALOG_PATH + '.lock', 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
@@ -1,21 +1,67 @@
+import atexit
+import csv
+import glob
 import os
 import sys
-from DBMS.Table import Table
-from DBMS.logger import log_command, LogStatus
-from DBMS.utils import load_catalog_entry, save_catalog_entry, DISK_PATH, PROJECT_ROOT
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from typing import Dict, Iterable, List, Optional, Tuple
+from DBMS.Catalog import catalog
+from DBMS.logger import log_command, LogStatus, flush_log, set_strict
+from DBMS.utils import DISK_PATH, LOG_DISK_PATH, PROJECT_ROOT
 from DBMS.exceptions import KeyConstraintViolation
+from DBMS.BufferPool import buffer_pool
+from DBMS.ScanPool import scan_pool
+from DBMS.Stats import stats
+from DBMS.BufferedWriter import BufferedWriter
+from DBMS.WriteAheadLog import WriteAheadLog
 
 output_file_path = os.path.join(PROJECT_ROOT, 'output.txt')
+output_writer = BufferedWriter(output_file_path) # search results are written in groups, like the log
+atexit.register(output_writer.close)
+
+# when a thread sets `results` to a list, the outcomes of the commands it runs are collected there instead of being
+# logged and written to the output file: (command, status, output lines) for each command, see server.py
+captured = threading.local()
+
 def print_output(message: str) -> None:
-    with open(output_file_path, 'a') as output_file:
-        output_file.write(message + '\n')
+    if getattr(captured, "results", None) is not None:
+        captured.output.append(message)
+    else:
+        output_writer.write(message + '\n')
+
+def log_result(input_line: str, status: LogStatus) -> None:
+    if getattr(captured, "results", None) is not None:
+        captured.results.append((input_line.strip(), status, captured.output))
+        captured.output = []
+    else:
+        log_command(input_line, status)
+
+wal_file_path = os.path.join(LOG_DISK_PATH, 'wal.log')
+wal: Optional[WriteAheadLog] = None # write-ahead log of the running session, see main()
 
 DEBUG_MODE = True
+
+# create record commands processed and committed together at most, like the rows of a block of Table.import_csv()
+RECORD_BATCH_SIZE = 10000
 def print_stdout(message: str) -> None:
     if DEBUG_MODE:
         print(message)
 
 def process_command(input_line):
+    """
+    Run a command, recording its duration if stats are collected.
+    """
+    if not stats.enabled:
+        _process_command(input_line)
+        return
+    started = time.perf_counter()
+    _process_command(input_line)
+    stats.record_command(" ".join(input_line.split()[:2]), time.perf_counter() - started)
+
+def _process_command(input_line):
     try:
         """
         Parse a command line input and return the command and its arguments.
@@ -23,17 +69,30 @@ def process_command(input_line):
         input_line_list = input_line.strip().split()
         command_type = " ".join(input_line_list[:2]) # first two words define the command type
         args = input_line_list[2:] # remaining words are arguments
+
+        # STATS COMMAND, output the counters collected so far and optionally reset them: stats [reset]
+        if input_line_list[:1] == ["stats"]:
+            if not stats.enabled or input_line_list[1:] not in ([], ["reset"]):
+                log_result(input_line, LogStatus.FAILURE)
+                return
+            for line in stats.report():
+                print_output(line)
+            if input_line_list[1:] == ["reset"]:
+                stats.reset()
+            log_result(input_line, LogStatus.SUCCESS)
+            return
+
         table_name = args[0]
 
         # CREATE COMMAND
         if command_type == "create type":
             if len(args) < 4:
-                log_command(input_line, LogStatus.FAILURE)
+                log_result(input_line, LogStatus.FAILURE)
                 return
 
             # Check if table already exists
-            if load_catalog_entry(table_name) is not None:
-                log_command(input_line, LogStatus.FAILURE)
+            if catalog.get_entry(table_name) is not None:
+                log_result(input_line, LogStatus.FAILURE)
                 return
 
             try:
@@ -41,8 +100,14 @@ def process_command(input_line):
                 pk_idx = int(args[2]) - 1 # arguments are 1-indexed, convert to 0-indexed
                 fields = args[3:]
 
+                # optional storage options given as key=value words after the fields, e.g. format=slotted
+                options = {}
+                while fields and "=" in fields[-1]:
+                    option, value = fields.pop().split("=", 1)
+                    options[option] = value
+
                 if int(len(fields)/2) != field_count:
-                    log_command(input_line, LogStatus.FAILURE)
+                    log_result(input_line, LogStatus.FAILURE)
                     return
 
                 fields_dict = {}
@@ -51,48 +116,46 @@ def process_command(input_line):
                     fields_dict[fields[i]] = fields[i + 1]  # field name and type
                     i += 2
 
-                Table(table_name, new_table_args=(field_count, pk_idx, fields_dict))
-                log_command(input_line, LogStatus.SUCCESS)
+                catalog.create_table(table_name, (field_count, pk_idx, fields_dict, options))
+                log_result(input_line, LogStatus.SUCCESS)
             except (ValueError, IndexError) as e:
-                log_command(input_line, LogStatus.FAILURE)
+                log_result(input_line, LogStatus.FAILURE)
             finally:
                 return
 
-        # ALL OTHER COMMANDS, GET TABLE SCHEMA FIRST
-        table_entry = load_catalog_entry(table_name)
-        if not table_entry:
-            log_command(input_line, LogStatus.FAILURE)
+        # ALL OTHER COMMANDS, GET TABLE FIRST
+        table = catalog.get_table(table_name)
+        if table is None:
+            log_result(input_line, LogStatus.FAILURE)
             return
-        table = Table(table_name)
 
         if command_type == "create record":
             field_values = args[1:]  # all arguments after the table name are field values
 
-            field_count = table_entry["field_count"]
-            if len(field_values) != field_count:
-                log_command(input_line, LogStatus.FAILURE)
+            if len(field_values) != table.field_count:
+                log_result(input_line, LogStatus.FAILURE)
                 return
 
             # create a new record in the table
             try:
                 table.add_record(field_values)
-                log_command(input_line, LogStatus.SUCCESS)  # Log the command as successful
+                log_result(input_line, LogStatus.SUCCESS)  # Log the command as successful
             except KeyConstraintViolation as e:
-                log_command(input_line, LogStatus.FAILURE)
+                log_result(input_line, LogStatus.FAILURE)
 
         elif command_type == "search record":
             searched_value = args[1]
             search_result = table.search_record(searched_value)
 
             if not search_result is None:
-                log_command(input_line, LogStatus.SUCCESS)  # Log the command as successful
                 found_record, _, _, _ = search_result # ignore the values of internal page and record number
                 output_str = ""
                 for _, value in found_record.items():
                     output_str += f"{value} "
                 print_output(output_str)
+                log_result(input_line, LogStatus.SUCCESS)  # Log the command as successful
             else:
-                log_command(input_line, LogStatus.FAILURE)
+                log_result(input_line, LogStatus.FAILURE)
 
         elif command_type == "delete record":
             # convert pk to int if the pk is an int
@@ -103,27 +166,332 @@ def process_command(input_line):
 
             deletion_successful = table.delete_record(pk_value)
             if deletion_successful:
-                log_command(input_line, LogStatus.SUCCESS)
+                log_result(input_line, LogStatus.SUCCESS)
+            else:
+                log_result(input_line, LogStatus.FAILURE)
+
+        elif command_type == "create index":
+            # index a field of the type, optionally with the index type: create index <type> <field> [hash|sorted]
+            if len(args) not in (2, 3):
+                log_result(input_line, LogStatus.FAILURE)
+                return
+            table.create_index(args[1], args[2] if len(args) == 3 else None)
+            log_result(input_line, LogStatus.SUCCESS)
+
+        elif command_type == "search by":
+            # records with a value in a field, or in a range of values of an int field: search by <type> <field> <value> [<high>]
+            field_name, searched_values = args[1], args[2:]
+            if len(searched_values) not in (1, 2):
+                log_result(input_line, LogStatus.FAILURE)
+                return
+            search_results = table.search_by(field_name, *searched_values)
+
+            if search_results:
+                for found_record, _, _, _ in search_results:
+                    output_str = ""
+                    for _, value in found_record.items():
+                        output_str += f"{value} "
+                    print_output(output_str)
+                log_result(input_line, LogStatus.SUCCESS)
             else:
-                log_command(input_line, LogStatus.FAILURE)
+                log_result(input_line, LogStatus.FAILURE)
+
+        elif command_type == "vacuum type":
+            # pack the records of the type into dense pages, the files are replaced rather than logged like convert
+            with wal.unlogged() if wal is not None else nullcontext():
+                reclaimed_bytes, reclaimed_pages = table.vacuum()
+            print_output(f"Vacuumed {table_name}: reclaimed {reclaimed_bytes} bytes in {reclaimed_pages} pages.")
+            log_result(input_line, LogStatus.SUCCESS)
+
+        elif command_type == "convert type":
+            # rewrite the records of the type in another page format, the files are replaced rather than logged
+            with wal.unlogged() if wal is not None else nullcontext():
+                table.convert(args[1])
+            log_result(input_line, LogStatus.SUCCESS)
+
+        elif command_type == "export type":
+            # write all records of the type to a CSV file: export type <type> <path>
+            if len(args) != 2:
+                log_result(input_line, LogStatus.FAILURE)
+                return
+            try:
+                record_count = table.export_csv(args[1])
+            except OSError:
+                log_result(input_line, LogStatus.FAILURE)
+                return
+            print_output(f"Exported {record_count} records of {table_name} to {args[1]}.")
+            log_result(input_line, LogStatus.SUCCESS)
+
+        elif command_type == "import type":
+            # add the records of a CSV file to the type: import type <type> <path>, each block of rows is committed on
+            # its own, so the pages it filled can be written back before the next one
+            if len(args) != 2:
+                log_result(input_line, LogStatus.FAILURE)
+                return
+            try:
+                added_count, row_count = table.import_csv(args[1], wal.commit if wal is not None else None)
+            except (OSError, csv.Error):
+                log_result(input_line, LogStatus.FAILURE)
+                return
+            print_output(f"Imported {added_count} of {row_count} records into {table_name}.")
+            log_result(input_line, LogStatus.SUCCESS)
     except (ValueError, KeyError, IndexError, OverflowError) as e:
-        log_command(input_line, LogStatus.FAILURE)
+        log_result(input_line, LogStatus.FAILURE)
 
-def main(input_file_path):
-    input_file = open(input_file_path, 'r')
+def record_batch_type(input_line: str) -> Optional[str]:
+    """
+    :return: The type name if the line is a `create record` command, which can be batched with the neighbouring
+             `create record` commands of the same type. None otherwise.
+    """
+    input_line_list = input_line.strip().split()
+    if len(input_line_list) >= 3 and input_line_list[:2] == ["create", "record"]:
+        return input_line_list[2]
+    return None
+
+def process_record_batch(input_lines: List[str]) -> None:
+    """
+    Process consecutive `create record` commands of the same type with a single bulk insert.
+    Each command is still logged on its own, in order, with the same outcome as if it was processed alone.
+    If stats are collected, each command is recorded with the mean duration of the batch.
+    """
+    if not stats.enabled:
+        _process_record_batch(input_lines)
+        return
+    started = time.perf_counter()
+    _process_record_batch(input_lines)
+    stats.record_command("create record", time.perf_counter() - started, len(input_lines))
+
+def _process_record_batch(input_lines: List[str]) -> None:
+    try:
+        table_name = record_batch_type(input_lines[0])
+        table = catalog.get_table(table_name)
+        if table is None:
+            for input_line in input_lines:
+                log_result(input_line, LogStatus.FAILURE)
+            return
+
+        rows = [input_line.strip().split()[3:] for input_line in input_lines] # field values of each command
+        results = table.bulk_insert(rows)
+    except (ValueError, KeyError, IndexError, OverflowError) as e:
+        results = [False] * len(input_lines)
+
+    for input_line, inserted in zip(input_lines, results):
+        log_result(input_line, LogStatus.SUCCESS if inserted else LogStatus.FAILURE)
+
+def start_session(strict: bool = False, session_wal_path: str = wal_file_path) -> None:
+    """
+    Prepare the disk directory and the write-ahead log before the first command runs.
+    :param strict: If True, the log and output lines of each command are written to their files before the next
+                   command runs, instead of in groups, and every command is synced to the write-ahead log on its own.
+    :param session_wal_path: Path of the write-ahead log, worker processes of main_parallel() have their own.
+    """
+    global wal
+    output_writer.strict = strict
+    set_strict(strict)
     if not os.path.exists(DISK_PATH):
         os.mkdir(DISK_PATH)
-    for line in input_file:
-        process_command(line)
+
+    if session_wal_path == wal_file_path:
+        # the logs of the workers of a parallel run that crashed, their types are disjoint so the order does not matter
+        for worker_wal_path in sorted(glob.glob(os.path.join(LOG_DISK_PATH, 'wal_*.log'))):
+            WriteAheadLog(worker_wal_path).recover()
+            os.remove(worker_wal_path)
+
+    # redo the commands a crashed run committed but did not write to the files, then log the commands of this run
+    wal = WriteAheadLog(session_wal_path, group_commit_size=1 if strict else 100)
+    wal.recover()
+    wal.attach()
+
+def end_session() -> None:
+    """
+    Write everything the commands changed to disk, after the last command ran.
+    """
+    # write back the pages modified by the commands, then the catalog entries describing them
+    wal.close()
+    buffer_pool.close()
+    catalog.flush()
+    output_writer.close()
+    flush_log()
+    stats.dump()
+
+def run_commands(input_lines: Iterable[str]) -> None:
+    """
+    Run commands in order, committing each to the write-ahead log. Consecutive `create record` commands of the same
+    type are processed together, see process_record_batch(), in batches of at most RECORD_BATCH_SIZE commands so a
+    large load does not become a single uncommitted change.
+    :param input_lines: The command lines.
+    """
+    batch = [] # consecutive create record commands of the same type, processed together
+    for line in input_lines:
+        batch_type = record_batch_type(line)
+        if batch and (batch_type != record_batch_type(batch[0]) or len(batch) >= RECORD_BATCH_SIZE):
+            process_record_batch(batch)
+            wal.commit()
+            batch = []
+        if batch_type is None:
+            process_command(line)
+            wal.commit()
+        else:
+            batch.append(line)
+    if batch:
+        process_record_batch(batch)
+        wal.commit()
+
+def main(input_file_path, strict: bool = False):
+    """
+    Run the commands of an input file.
+    :param input_file_path: Path of the input file.
+    :param strict: If True, the log and output lines of each command are written to their files before the next
+                   command runs, instead of in groups, and every command is synced to the write-ahead log on its own.
+    """
+    input_file = open(input_file_path, 'r')
+    start_session(strict)
+    try:
+        run_commands(input_file)
+    finally:
+        end_session()
+
+def run_streams(streams: List[List[Tuple[int, str]]], worker_number: int, strict: bool = False,
+                collect_stats: bool = False, pool_capacity: Optional[int] = None
+                ) -> Tuple[List[Tuple[int, str, LogStatus, List[str]]], Optional[dict]]:
+    """
+    Run command streams in a worker process of main_parallel(), each stream in order.
+    The results are returned rather than logged, and the worker commits to a write-ahead log of its own.
+    :param streams: (command number, command line) of the commands of each stream.
+    :param worker_number: Number of the worker, which names its write-ahead log.
+    :param strict: If True, every command is synced to the write-ahead log on its own.
+    :param collect_stats: If True, the stats of the worker are collected and returned, see DBMS/Stats.py.
+    :param pool_capacity: Memory budget of the buffer pool of the worker in bytes, unchanged if None.
+    :return: (command number, command, status, output lines) of each command, and the stats of the worker if collected.
+    """
+    scan_pool.set_workers(1) # the other workers already keep the remaining CPUs busy
+    if pool_capacity is not None:
+        buffer_pool.set_capacity(pool_capacity)
+    if collect_stats:
+        stats.enable()
+        stats.reset()
+    worker_wal_path = os.path.join(LOG_DISK_PATH, f'wal_{worker_number}.log')
+    start_session(strict, worker_wal_path)
+    captured.results = []
+    captured.output = []
+    try:
+        for stream in streams:
+            run_commands(input_line for _, input_line in stream)
+        results = captured.results
+    finally:
+        captured.results = None
+        end_session()
+    if os.path.getsize(worker_wal_path) == 0: # kept if the last command was interrupted, to be recovered
+        os.remove(worker_wal_path)
+
+    command_numbers = [command_number for stream in streams for command_number, _ in stream]
+    return ([(command_number, input_line, status, output)
+             for command_number, (input_line, status, output) in zip(command_numbers, results)],
+            stats.snapshot() if collect_stats else None)
+
+def main_parallel(input_file_paths: List[str], workers: Optional[int] = None, strict: bool = False):
+    """
+    Run the commands of several input files, or of one large file, in worker processes.
+    Every command acts on the single type it names, so the commands are split into one stream per type name, and the
+    streams are spread over the workers. Each stream runs in order in one worker, so the commands of a type see the
+    same state as if the files ran one after another. The log and output lines are written afterwards in the order of
+    the commands in the files, so they are the same as with main(), except for stats commands, which run once all
+    workers finished and report the stats of all of them.
+    :param input_file_paths: Paths of the input files, in the order their commands would run.
+    :param workers: Number of worker processes, defaults to the number of CPUs.
+    :param strict: If True, every command is synced to the write-ahead log on its own.
+    """
+    workers = workers if workers is not None else (os.cpu_count() or 1)
+    streams: Dict[str, List[Tuple[int, str]]] = {}
+    stats_commands: List[Tuple[int, str]] = [] # run by this process once the stats of all workers are merged
+    command_number = 0
+    for input_file_path in input_file_paths:
+        with open(input_file_path, 'r') as input_file:
+            for line in input_file:
+                # the type name is the third word of every command, commands without one fail without touching any type
+                input_line_list = line.split()
+                if input_line_list[:1] == ["stats"]:
+                    stats_commands.append((command_number, line))
+                else:
+                    type_name = input_line_list[2] if len(input_line_list) >= 3 else ""
+                    streams.setdefault(type_name, []).append((command_number, line))
+                command_number += 1
+
+    # the longest streams first, each to the worker with the fewest commands so far
+    assignments = [[] for _ in range(max(1, min(workers, len(streams))))]
+    assigned_commands = [0] * len(assignments)
+    for stream in sorted(streams.values(), key=len, reverse=True):
+        worker_number = assigned_commands.index(min(assigned_commands))
+        assignments[worker_number].append(stream)
+        assigned_commands[worker_number] += len(stream)
+
+    start_session(strict)
+    try:
+        with ProcessPoolExecutor(max_workers=len(assignments)) as executor:
+            futures = [executor.submit(run_streams, assigned_streams, worker_number, strict, stats.enabled,
+                                       buffer_pool.capacity)
+                       for worker_number, assigned_streams in enumerate(assignments)]
+            results = []
+            for future in futures:
+                worker_results, worker_stats = future.result()
+                results += worker_results
+                if worker_stats is not None:
+                    stats.merge(worker_stats)
+        # the streams of the workers run at the same time, so there is no state of the counters as of a command in
+        # the middle of the files. stats commands report the counters of the whole run instead
+        captured.results = []
+        captured.output = []
+        try:
+            for _, input_line in stats_commands:
+                process_command(input_line)
+            results += [(command_number, *result) for (command_number, _), result in zip(stats_commands, captured.results)]
+        finally:
+            captured.results = None
+        results.sort(key=lambda result: result[0])
+        for _, input_line, status, output in results:
+            for output_line in output:
+                print_output(output_line)
+            log_command(input_line, status)
+    finally:
+        end_session()
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        sys.stderr.write("Usage: python archive.py <full_input_file_path>\n")
+    args = sys.argv[1:]
+    strict_mode = "--strict" in args # write the log and output of every command immediately
+    if strict_mode:
+        args.remove("--strict")
+    if "--stats" in args: # count the work done by commands, output by the stats command
+        args.remove("--stats")
+        stats.enable()
+    worker_count = 1 # run the input files in worker processes if more than 1, see main_parallel()
+    memory_budget = None # memory budget of the buffer pool in MiB, of each process with --workers
+    for option in ("--workers", "--stats-file", "--memory"):
+        if option in args:
+            option_index = args.index(option)
+            if option_index + 1 >= len(args):
+                args = []
+                break
+            if option == "--stats-file": # count as with --stats, and write the stats to the file as JSON at the end
+                stats.enable(args[option_index + 1])
+            elif option == "--memory":
+                memory_budget = int(args[option_index + 1]) if args[option_index + 1].isdigit() else 0
+            else:
+                worker_count = int(args[option_index + 1]) if args[option_index + 1].isdigit() else 0
+            del args[option_index:option_index + 2]
+    if len(args) < 1 or worker_count < 1 or memory_budget == 0:
+        sys.stderr.write("Usage: python archive.py [--strict] [--stats] [--stats-file <path>] [--workers <n>] "
+                         "[--memory <MiB>] <full_input_file_path> [<full_input_file_path> ...]\n")
         exit(1)
+    if memory_budget is not None:
+        buffer_pool.set_capacity(memory_budget * 1024 * 1024)
 
-    input_file_path = sys.argv[1]
-    if not os.path.isfile(input_file_path):
-        sys.stderr.write(f"File {input_file_path} does not exist.\n")
-        exit(1)
+    for input_file_path in args:
+        if not os.path.isfile(input_file_path):
+            sys.stderr.write(f"File {input_file_path} does not exist.\n")
+            exit(1)
 
-    main(input_file_path)
\ No newline at end of file
+    if worker_count > 1:
+        main_parallel(args, worker_count, strict=strict_mode)
+    else:
+        for input_file_path in args:
+            main(input_file_path, strict=strict_mode)
@@ -0,0 +1,326 @@
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import string
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import Dict, List, Optional, Tuple
+
+# operations of the run phase, by the first word of their command
+OPERATIONS = {"create": "insert", "search": "search", "delete": "delete"}
+LATENCY_PERCENTILES = (50, 90, 99)
+
+
+class Workload:
+    def __init__(self, rows: int, operations: int, mix: Dict[str, float], distribution: str = "uniform",
+                 miss_rate: float = 0.0, fields: str = "name str origin str power int", options: str = "",
+                 seed: int = 1):
+        """
+        Initialize a synthetic workload on a single type, in the command language of input files.
+        The load phase inserts `rows` records with consecutive keys in random order, then the run phase mixes inserts
+        of new keys with searches and deletes of the keys drawn from the records present at that point.
+
+        :param rows: Number of records inserted by the load phase.
+        :param operations: Number of commands of the run phase.
+        :param mix: Share of each operation of the run phase, e.g. {"insert": 0.2, "search": 0.7, "delete": 0.1}.
+        :param distribution: How searched and deleted keys are drawn from the present records: "uniform", "zipf"
+                             (a few hot keys, ranked by a Pareto distribution) or "latest" (mostly recent inserts).
+        :param miss_rate: Share of searches and deletes of keys that are not present.
+        :param fields: Fields of the type after the int primary key `id`, as names and types like in `create type`.
+        :param options: Storage options of the type like in `create type`, e.g. "format=slotted partitions=4".
+        :param seed: Seed of the random generator, the same workload always generates the same commands.
+        """
+
+        # constants
+        self.TYPE_NAME = "bench"
+        self.STR_LENGTH = 12
+        self.INT_RANGE = 100000
+        self.ZIPF_ALPHA = 1.2
+
+        if rows < 0 or operations < 0:
+            raise ValueError("Number of rows and operations must not be negative.")
+        if set(mix) - set(OPERATIONS.values()) or any(share < 0 for share in mix.values()) or sum(mix.values()) <= 0:
+            raise ValueError(f"Invalid operation mix {mix}, expected shares of {', '.join(OPERATIONS.values())}.")
+        if distribution not in ("uniform", "zipf", "latest"):
+            raise ValueError(f"Invalid key distribution '{distribution}', expected uniform, zipf or latest.")
+        if not 0 <= miss_rate <= 1:
+            raise ValueError("Miss rate must be between 0 and 1.")
+        field_words = fields.split()
+        if len(field_words) % 2 or any(field_type not in ("int", "str") for field_type in field_words[1::2]):
+            raise ValueError(f"Invalid fields '{fields}', expected names and types (int or str).")
+
+        self.rows = rows
+        self.operations = operations
+        self.mix = {operation: round(share / sum(mix.values()), 6) for operation, share in mix.items()}
+        self.distribution = distribution
+        self.miss_rate = miss_rate
+        self.fields = fields
+        self.field_types = field_words[1::2]
+        self.options = options
+        self.seed = seed
+
+    @property
+    def name(self) -> str:
+        mix = "-".join(f"{operation}{round(share * 100)}" for operation, share in self.mix.items())
+        return f"{self.rows}rows-{mix}-{self.distribution}-miss{round(self.miss_rate * 100)}"
+
+    def to_dict(self) -> dict:
+        return {"rows": self.rows, "operations": self.operations, "mix": self.mix, "distribution": self.distribution,
+                "miss_rate": self.miss_rate, "fields": self.fields, "options": self.options, "seed": self.seed}
+
+    def _record(self, rng: random.Random, key: int) -> str:
+        values = [str(key)]
+        for field_type in self.field_types:
+            if field_type == "int":
+                values.append(str(rng.randrange(self.INT_RANGE)))
+            else:
+                values.append("".join(rng.choices(string.ascii_letters, k=self.STR_LENGTH)))
+        return f"create record {self.TYPE_NAME} {' '.join(values)}"
+
+    def _present_key(self, rng: random.Random, keys: List[int]) -> int:
+        if self.distribution == "uniform":
+            return keys[rng.randrange(len(keys))]
+        rank = min(int(rng.paretovariate(self.ZIPF_ALPHA)) - 1, len(keys) - 1)
+        if self.distribution == "latest":
+            return keys[len(keys) - 1 - rank]
+        return keys[(rank * 2654435761) % len(keys)] # hot keys spread over the key space rather than the first ones
+
+    def generate(self, directory: str) -> Tuple[str, str]:
+        """
+        Write the commands of the workload as input files, see inputsets/.
+        :param directory: Directory of the files, created if needed.
+        :return: Paths of the load phase file (input1.txt) and the run phase file (input2.txt).
+        """
+        os.makedirs(directory, exist_ok=True)
+        rng = random.Random(self.seed)
+        load_path, run_path = os.path.join(directory, "input1.txt"), os.path.join(directory, "input2.txt")
+
+        keys = list(range(self.rows))
+        rng.shuffle(keys)
+        with open(load_path, 'w') as f:
+            options = f" {self.options}" if self.options else ""
+            field_count = len(self.field_types) + 1
+            f.write(f"create type {self.TYPE_NAME} {field_count} 1 id int {self.fields}{options}\n")
+            for key in keys:
+                f.write(self._record(rng, key) + "\n")
+
+        # keys present at each point of the run phase, in insertion order, and their positions for deletes
+        positions = {key: position for position, key in enumerate(keys)}
+        next_key = self.rows
+        operations, shares = list(self.mix), list(self.mix.values())
+        with open(run_path, 'w') as f:
+            for operation in rng.choices(operations, weights=shares, k=self.operations):
+                if operation == "insert":
+                    positions[next_key] = len(keys)
+                    keys.append(next_key)
+                    f.write(self._record(rng, next_key) + "\n")
+                    next_key += 1
+                    continue
+
+                if not keys or rng.random() < self.miss_rate:
+                    key = -1 - rng.randrange(self.INT_RANGE) # never inserted
+                else:
+                    key = self._present_key(rng, keys)
+                if operation == "search":
+                    f.write(f"search record {self.TYPE_NAME} {key}\n")
+                else:
+                    f.write(f"delete record {self.TYPE_NAME} {key}\n")
+                    if key in positions: # move the last key into the place of the deleted one
+                        position = positions.pop(key)
+                        last_key = keys.pop()
+                        if last_key != key:
+                            keys[position] = last_key
+                            positions[last_key] = position
+        return load_path, run_path
+
+
+def _io_counters() -> Dict[str, Optional[int]]:
+    # bytes this process passed to read and write calls, Linux only, memory mapped scans are not included
+    counters = {"read_bytes": None, "written_bytes": None}
+    try:
+        with open("/proc/self/io") as f:
+            values = dict(line.split(": ") for line in f.read().splitlines())
+        counters = {"read_bytes": int(values["rchar"]), "written_bytes": int(values["wchar"])}
+    except (OSError, KeyError, ValueError):
+        pass
+    return counters
+
+def _percentiles(latencies: List[float]) -> Dict[str, float]:
+    latencies = sorted(latencies)
+    result = {"count": len(latencies)}
+    if latencies:
+        for percentile in LATENCY_PERCENTILES:
+            result[f"p{percentile}_us"] = round(latencies[min(len(latencies) - 1, len(latencies) * percentile // 100)] * 1e6, 1)
+        result["max_us"] = round(latencies[-1] * 1e6, 1)
+    return result
+
+def _run_phases(load_path: str, run_path: str, pool_capacity: Optional[int] = None) -> dict:
+    # runs in a fresh process whose ARCHIVE_ROOT is the scratch directory of the workload, so archive is imported here
+    import archive
+    from DBMS.utils import DISK_PATH
+
+    if pool_capacity is not None:
+        archive.buffer_pool.set_capacity(pool_capacity)
+
+    archive.DEBUG_MODE = False
+    archive.stats.enable() # counters of the page and catalog accesses, saved with the timings
+    archive.start_session()
+    try:
+        io_start = _io_counters()
+        load_start = time.perf_counter()
+        with open(load_path) as f:
+            archive.run_commands(f) # committed every archive.RECORD_BATCH_SIZE records, so any size fits the budget
+        load_seconds = time.perf_counter() - load_start
+
+        latencies = {operation: [] for operation in OPERATIONS.values()}
+        run_start = time.perf_counter()
+        with open(run_path) as f:
+            for line in f:
+                command_start = time.perf_counter()
+                archive.process_command(line)
+                archive.wal.commit()
+                latencies[OPERATIONS[line.split(" ", 1)[0]]].append(time.perf_counter() - command_start)
+        run_seconds = time.perf_counter() - run_start
+    finally:
+        close_start = time.perf_counter()
+        archive.end_session()
+        close_seconds = time.perf_counter() - close_start
+    io_end = _io_counters()
+
+    with open(load_path) as f:
+        load_count = sum(1 for _ in f)
+    operation_count = sum(len(operation_latencies) for operation_latencies in latencies.values())
+    disk_bytes = sum(os.path.getsize(os.path.join(DISK_PATH, file_name)) for file_name in os.listdir(DISK_PATH))
+    return {
+        "load": {"seconds": round(load_seconds, 4), "commands": load_count,
+                 "commands_per_second": round(load_count / load_seconds, 1) if load_seconds else None},
+        "run": {"seconds": round(run_seconds, 4), "commands": operation_count,
+                "commands_per_second": round(operation_count / run_seconds, 1) if run_seconds else None},
+        "close_seconds": round(close_seconds, 4),
+        "latency": {operation: _percentiles(operation_latencies) for operation, operation_latencies in latencies.items()
+                    if operation_latencies},
+        "io": {counter: (io_end[counter] - io_start[counter] if io_start[counter] is not None else None)
+               for counter in io_start},
+        "disk_bytes": disk_bytes,
+        "buffer_pool_bytes": archive.buffer_pool.capacity,
+        "stats": archive.stats.snapshot(),
+    }
+
+def run_workload(workload: Workload, keep: bool = False, pool_capacity: Optional[int] = None) -> dict:
+    """
+    Generate a workload and run it through archive.py in a fresh process and scratch directory, so every workload
+    starts from an empty disk and a cold buffer pool.
+    :param workload: The workload.
+    :param keep: If True, the scratch directory with the input files and the database files is kept.
+    :param pool_capacity: Memory budget of the buffer pool in bytes, the default budget if None.
+    :return: The configuration, timings, latency percentiles and I/O counters of the run.
+    """
+    root = tempfile.mkdtemp(prefix="archive-benchmark-")
+    try:
+        load_path, run_path = workload.generate(os.path.join(root, "inputs"))
+        os.environ["ARCHIVE_ROOT"] = root # read by the spawned process when it imports archive
+        try:
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+                result = executor.submit(_run_phases, load_path, run_path, pool_capacity).result()
+        finally:
+            del os.environ["ARCHIVE_ROOT"]
+    finally:
+        if not keep:
+            shutil.rmtree(root, ignore_errors=True)
+    return {"name": workload.name, "workload": workload.to_dict(), **result,
+            **({"directory": root} if keep else {})}
+
+def _version() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results: dict, baseline: dict) -> None:
+    """
+    Print the change of throughput and tail latency of each workload present in both results.
+    :param results: Results of this version, as saved by main().
+    :param baseline: Results of an earlier version.
+    """
+    baseline_workloads = {workload["name"]: workload for workload in baseline["workloads"]}
+    print(f"Compared to {baseline.get('version')}:")
+    for workload in results["workloads"]:
+        old = baseline_workloads.get(workload["name"])
+        if old is None:
+            continue
+        changes = [f"run {workload['run']['commands_per_second'] / old['run']['commands_per_second']:.2f}x"
+                   if workload['run']['commands_per_second'] and old['run']['commands_per_second'] else "run -"]
+        for operation, latency in workload["latency"].items():
+            old_latency = old["latency"].get(operation)
+            if old_latency and old_latency.get("p99_us") and latency.get("p99_us"):
+                changes.append(f"{operation} p99 {latency['p99_us'] / old_latency['p99_us']:.2f}x")
+        print(f"  {workload['name']}: {', '.join(changes)}")
+
+def _parse_mix(mix: str) -> Dict[str, float]:
+    try:
+        return {operation: float(share) for operation, share in (part.split("=") for part in mix.split(","))}
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid operation mix '{mix}', expected e.g. search=0.7,insert=0.2,delete=0.1")
+
+def main(argv: List[str]) -> None:
+    parser = argparse.ArgumentParser(description="Measure the throughput and latency of archive.py on synthetic workloads.")
+    parser.add_argument("--rows", default="1000,10000,100000",
+                        help="comma separated table sizes, one workload is run for each (default: %(default)s)")
+    parser.add_argument("--operations", type=int, default=10000, help="commands of the run phase (default: %(default)s)")
+    parser.add_argument("--mix", type=_parse_mix, default="search=0.7,insert=0.2,delete=0.1",
+                        help="share of each operation of the run phase (default: %(default)s)")
+    parser.add_argument("--distribution", choices=("uniform", "zipf", "latest"), default="uniform",
+                        help="distribution of the searched and deleted keys (default: %(default)s)")
+    parser.add_argument("--miss-rate", type=float, default=0.1,
+                        help="share of searches and deletes of absent keys (default: %(default)s)")
+    parser.add_argument("--fields", default="name str origin str power int",
+                        help="fields after the int primary key, like in create type (default: %(default)s)")
+    parser.add_argument("--options", default="", help="storage options of the type, e.g. 'format=slotted partitions=4'")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default="benchmark.json", help="file the results are saved to (default: %(default)s)")
+    parser.add_argument("--compare", metavar="BASELINE", help="results of an earlier version to compare with")
+    parser.add_argument("--generate", metavar="DIRECTORY",
+                        help="only write the input files of each workload to DIRECTORY/<workload name>")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch directory of each workload")
+    parser.add_argument("--memory", type=int, metavar="MIB", help="memory budget of the buffer pool in MiB")
+    args = parser.parse_args(argv)
+
+    try:
+        workloads = [Workload(int(rows), args.operations, args.mix, args.distribution, args.miss_rate, args.fields,
+                              args.options, args.seed) for rows in args.rows.split(",")]
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.generate:
+        for workload in workloads:
+            workload.generate(os.path.join(args.generate, workload.name))
+        return
+
+    results = {"version": _version(), "python": platform.python_version(), "platform": platform.platform(),
+               "time": int(time.time()), "workloads": []}
+    for workload in workloads:
+        result = run_workload(workload, keep=args.keep,
+                              pool_capacity=args.memory * 1024 * 1024 if args.memory is not None else None)
+        results["workloads"].append(result)
+        latency = ", ".join(f"{operation} p50 {percentiles['p50_us']}us p99 {percentiles['p99_us']}us"
+                            for operation, percentiles in result["latency"].items())
+        print(f"{workload.name}: load {result['load']['commands_per_second']}/s, "
+              f"run {result['run']['commands_per_second']}/s, {latency}")
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=4)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,235 @@
+import asyncio
+import os
+import signal
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import List, Optional, Tuple
+import archive
+from DBMS.BufferPool import buffer_pool
+from DBMS.Catalog import catalog
+from DBMS.logger import log_command, LogStatus, flush_log
+from DBMS.Stats import stats
+
+# commands that only read the tables, they run in parallel with each other
+READ_COMMANDS = ("search record", "search by")
+
+
+class ReadWriteLock:
+    def __init__(self):
+        """
+        Initialize an asyncio lock held either by any number of readers at once or by a single writer.
+        A waiting writer keeps new readers from acquiring the lock, so a steady stream of reads cannot starve it.
+        """
+        self.condition = asyncio.Condition()
+        self.readers = 0
+        self.writing = False
+        self.waiting_writers = 0
+
+    @asynccontextmanager
+    async def read(self):
+        async with self.condition:
+            await self.condition.wait_for(lambda: not self.writing and self.waiting_writers == 0)
+            self.readers += 1
+        try:
+            yield
+        finally:
+            async with self.condition:
+                self.readers -= 1
+                self.condition.notify_all()
+
+    @asynccontextmanager
+    async def write(self):
+        async with self.condition:
+            self.waiting_writers += 1
+            await self.condition.wait_for(lambda: not self.writing and self.readers == 0)
+            self.waiting_writers -= 1
+            self.writing = True
+        try:
+            yield
+        finally:
+            async with self.condition:
+                self.writing = False
+                self.condition.notify_all()
+
+
+class ArchiveServer:
+    def __init__(self, socket_path: str, read_workers: Optional[int] = None, strict: bool = False):
+        """
+        Initialize a server running the commands of clients connected to a Unix socket, in a single long-running
+        process, so the catalog, the tables and the buffer pool stay loaded between clients.
+
+        Clients send commands in the language of input files, one per line, and may send many commands without
+        waiting for their results. The results are sent back in the order of the commands, each as a line with the
+        status and the number of output lines, followed by the output lines (the records found by searches, or the
+        summaries of vacuum, export and import):
+            success 1
+            Atreides Caladan Leto 90
+        Commands are logged like in archive.py, while the output lines only go to the client.
+
+        Commands run in a pool of threads. Reads run in parallel, while each write runs alone and is committed to the
+        write-ahead log before the next command starts, as the log commits the page changes of one command at a time.
+        Consecutive `create record` commands of the same type sent by a client are inserted as a single batch.
+
+        :param socket_path: Path of the Unix socket, it is replaced if it exists.
+        :param read_workers: Number of threads running reads in parallel, defaults to the number of CPUs.
+        :param strict: If True, every write is synced to the write-ahead log before its result is sent.
+        """
+
+        # constants
+        self.READ_SIZE = 64 * 1024 # bytes read from a client at once, all complete commands in them are queued together
+        self.SYNC_INTERVAL = 0.5 # seconds between syncs of the log files while the server is idle
+
+        self.socket_path = socket_path
+        self.strict = strict
+        self.executor = ThreadPoolExecutor(max_workers=read_workers if read_workers is not None else (os.cpu_count() or 1))
+        self.lock = ReadWriteLock()
+        self.stopping: Optional[asyncio.Event] = None
+
+    def _command_groups(self, lines: List[str]) -> List[Tuple[str, List[str]]]:
+        # split the commands of a client into ("batch", create record lines of one type), ("read", consecutive reads)
+        # and ("write", a single command) groups, each run by one task
+        groups = []
+        for line in lines:
+            if not line.strip():
+                continue
+            batch_type = archive.record_batch_type(line)
+            if batch_type is not None:
+                kind = "batch"
+                if groups and groups[-1][0] == kind and archive.record_batch_type(groups[-1][1][0]) == batch_type:
+                    groups[-1][1].append(line)
+                    continue
+            elif " ".join(line.split()[:2]) in READ_COMMANDS:
+                kind = "read"
+                if groups and groups[-1][0] == kind:
+                    groups[-1][1].append(line)
+                    continue
+            else:
+                kind = "write"
+            groups.append((kind, [line]))
+        return groups
+
+    def _execute(self, kind: str, lines: List[str]) -> List[Tuple[str, LogStatus, List[str]]]:
+        # run a group of commands in a worker thread, collecting their results instead of logging them
+        archive.captured.results = []
+        archive.captured.output = []
+        try:
+            if kind == "batch":
+                archive.process_record_batch(lines)
+            else:
+                for line in lines:
+                    archive.process_command(line)
+            if kind != "read":
+                archive.wal.commit()
+            return archive.captured.results
+        finally:
+            archive.captured.results = None
+
+    @staticmethod
+    def _tables_loaded(lines: List[str]) -> bool:
+        # True if the types the commands read are cached or do not exist, so running them cannot load a table
+        for line in lines:
+            words = line.split()
+            if len(words) > 2 and words[2] not in catalog.tables and catalog.get_entry(words[2]) is not None:
+                return False
+        return True
+
+    async def _run(self, kind: str, lines: List[str]) -> List[Tuple[str, LogStatus, List[str]]]:
+        loop = asyncio.get_running_loop()
+        results = None
+        if kind == "read":
+            async with self.lock.read():
+                # loading a type may write, when it recovers an interrupted rewrite or builds missing structures, so
+                # the first read of a type runs as a write instead. Tables are only dropped from the cache by writes
+                if self._tables_loaded(lines):
+                    results = await loop.run_in_executor(self.executor, self._execute, kind, lines)
+        if results is None:
+            kind = "load" if kind == "read" else kind # committed like a write, see _execute()
+            async with self.lock.write():
+                results = await loop.run_in_executor(self.executor, self._execute, kind, lines)
+        for input_line, status, _ in results:
+            log_command(input_line, status)
+        return results
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        pending = b'' # start of a command whose line break was not received yet
+        try:
+            while True:
+                data = await reader.read(self.READ_SIZE)
+                if not data:
+                    lines, pending = [pending], b''
+                else:
+                    lines = (pending + data).split(b'\n')
+                    pending = lines.pop()
+                for kind, group in self._command_groups([line.decode('utf-8', 'replace') for line in lines]):
+                    for _, status, output in await self._run(kind, group):
+                        writer.write(f"{status.value} {len(output)}\n".encode('utf-8'))
+                        writer.writelines(f"{line}\n".encode('utf-8') for line in output)
+                    await writer.drain()
+                if not data:
+                    break
+        except ConnectionError:
+            pass # the client went away, the results of its commands are still logged
+        finally:
+            writer.close()
+
+    async def _sync_periodically(self) -> None:
+        # group commit only syncs the write-ahead log on commits, make the last commits durable once clients pause
+        while not self.stopping.is_set():
+            try:
+                await asyncio.wait_for(self.stopping.wait(), self.SYNC_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            flush_log()
+            if archive.wal.unsynced_commits:
+                async with self.lock.write():
+                    await asyncio.get_running_loop().run_in_executor(self.executor, archive.wal.sync)
+
+    async def serve(self) -> None:
+        """
+        Accept clients until the process receives SIGINT or SIGTERM, then write everything to disk.
+        """
+        self.stopping = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signal_number in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signal_number, self.stopping.set)
+
+        archive.start_session(self.strict)
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        server = await asyncio.start_unix_server(self._handle_client, path=self.socket_path)
+        sync_task = asyncio.create_task(self._sync_periodically())
+        try:
+            await self.stopping.wait()
+        finally:
+            server.close()
+            await server.wait_closed()
+            await sync_task
+            async with self.lock.write(): # let the running commands finish
+                self.executor.shutdown(wait=True)
+            archive.end_session()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    strict_mode = "--strict" in args # sync every write to the write-ahead log before sending its result
+    if strict_mode:
+        args.remove("--strict")
+    if "--stats" in args: # count the work done by commands, clients get the counters with the stats command
+        args.remove("--stats")
+        stats.enable()
+    if "--memory" in args: # memory budget of the buffer pool in MiB
+        option_index = args.index("--memory")
+        memory_budget = args[option_index + 1] if option_index + 1 < len(args) else ""
+        del args[option_index:option_index + 2]
+        if not memory_budget.isdigit() or int(memory_budget) < 1:
+            args = []
+        else:
+            buffer_pool.set_capacity(int(memory_budget) * 1024 * 1024)
+    if len(args) < 1:
+        sys.stderr.write("Usage: python server.py [--strict] [--stats] [--memory <MiB>] <socket_path> [<read_workers>]\n")
+        exit(1)
+
+    asyncio.run(ArchiveServer(args[0], int(args[1]) if len(args) > 1 else None, strict=strict_mode).serve())